@@ -9,8 +9,25 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Live results streams (/polls/<id>/events/) are served outside Django's request cycle.
+from polls.sse import sse_application  # noqa: E402
+
+application = sse_application(django_application)
+
+# Opt-in: pay the first-request costs before the worker takes traffic.
+# Servers may import this module inside their event loop, where Django refuses
+# database access, so the warm-up runs in a thread of its own.
+if settings.POLLS_WARMUP:
+    import threading  # noqa: E402
+
+    from polls.warmup import warm_up  # noqa: E402
+    warmer = threading.Thread(target=warm_up, name='warm-up')
+    warmer.start()
+    warmer.join()
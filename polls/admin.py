@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Question, Choice
+from .models import Question, Choice, Vote
 
 
 class ChoiceInline(admin.TabularInline):
@@ -8,13 +8,14 @@ class ChoiceInline(admin.TabularInline):
 
     model = Choice
     extra = 3
+    readonly_fields = ['vote_count']
 
 
 class QuestionAdmin(admin.ModelAdmin):
     """Create a question for polls app."""
 
     fieldsets = [
-        (None, {'fields': ['question_text']}),
+        (None, {'fields': ['question_text', 'kind']}),
         ('Date information', {
             'fields': ['pub_date', 'end_date'],
             'classes': ['collapse']
@@ -26,14 +27,60 @@ class QuestionAdmin(admin.ModelAdmin):
         'question_text',
         'pub_date',
         'was_published_recently',
-        'end_date'
+        'end_date',
+        'total_votes',
     )
 
-    list_filter = ['pub_date']
+    list_filter = ['pub_date', 'kind']
 
     search_fields = ['question_text']
 
+    # skip the extra COUNT(*) over the whole table on every changelist page.
+    show_full_result_count = False
+
+    def total_votes(self, question):
+        """Return the denormalized vote total of the question."""
+        return question.vote_total
+
+    total_votes.admin_order_field = 'vote_total'
+    total_votes.short_description = 'Votes'
+
+
+class ChoiceAdmin(admin.ModelAdmin):
+    """List choices with their question in one query."""
+
+    list_display = ('choice_text', 'question', 'vote_count')
+    list_select_related = ('question',)
+    raw_id_fields = ('question',)
+    readonly_fields = ('vote_count',)
+    search_fields = ['choice_text']
+    show_full_result_count = False
+
+
+class VoteAdmin(admin.ModelAdmin):
+    """Browse votes read-only; adding or editing one here would skip the vote counters and buckets."""
+
+    list_display = ('id', 'question', 'choice', 'user', 'voted_at')
+    list_select_related = ('question', 'choice', 'user')
+    date_hierarchy = 'voted_at'
+    ordering = ('-id',)
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        """Votes are only cast through Vote.objects.cast()."""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """Votes are only changed through Vote.objects.cast()."""
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        """Deleting a vote would leave its choice and question counts too high."""
+        return False
+
 
 admin.site.register(Question, QuestionAdmin)
 
-admin.site.register(Choice)
+admin.site.register(Choice, ChoiceAdmin)
+
+admin.site.register(Vote, VoteAdmin)
@@ -0,0 +1,121 @@
+"""Read-only JSON API for polls and their results with conditional GET support."""
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import condition, require_GET
+
+from .cache import results_cache
+from .export import parse_range
+from .models import Choice, Question, VoteRollup
+from .tally import final_counts
+from .views import decode_cursor, encode_cursor
+
+QUESTION_FIELDS = ('id', 'question_text', 'pub_date', 'end_date', 'vote_total', 'tally_version')
+
+
+def revalidate(response):
+    """Let clients keep the response but ask them to revalidate it every time."""
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_GET
+def questions(request):
+    """List one page of questions, newest first, filtered by ``status`` and ``after`` like the index."""
+    page_size = settings.POLLS_INDEX_PAGE_SIZE
+    queryset = Question.objects.with_status(request.GET.get('status'))
+    cursor = decode_cursor(request.GET.get('after'))
+    if cursor:
+        queryset = queryset.after(*cursor)
+    rows = list(queryset.order_by('-pub_date', '-id').values(*QUESTION_FIELDS, 'is_open')[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(Question(id=rows[-1]['id'], pub_date=rows[-1]['pub_date']))
+    etag = f'"{hashlib.sha1(repr((rows, next_cursor)).encode()).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'questions': rows, 'next': next_cursor})
+        response['ETag'] = etag
+    return revalidate(response)
+
+
+def tally_state(request, pk):
+    """Return the (tally_version, last modified, kind) of question `pk`, looked up once per request."""
+    if not hasattr(request, '_tally_state'):
+        state = Question.objects.filter(pk=pk, pub_date__lte=timezone.now()).values_list(
+            'tally_version', 'tally_updated_at', 'pub_date', 'kind').first()
+        if state is None:
+            raise Http404('No question matches the given query.')
+        request._tally_state = state[0], state[1] or state[2], state[3]
+    return request._tally_state
+
+
+def results_etag(request, pk):
+    """Return a strong ETag that changes with every vote on the question."""
+    return f'{pk}-{tally_state(request, pk)[0]}'
+
+
+def results_last_modified(request, pk):
+    """Return the time of the last vote on the question."""
+    return tally_state(request, pk)[1]
+
+
+@require_GET
+@condition(etag_func=results_etag, last_modified_func=results_last_modified)
+def results(request, pk):
+    """Return the tally of a question; unchanged tallies get a 304 before any choice is read.
+
+    Ranked questions count the ballots of each choice in the last runoff
+    round and add the ``winner`` and number of ``ballots``.
+    """
+    version, _, kind = tally_state(request, pk)
+    choices = list(Choice.objects.filter(question_id=pk).order_by('id').values('id', 'choice_text', 'vote_count'))
+    data = {'id': pk, 'tally_version': version}
+    if kind == Question.RANKED:
+        runoff = results_cache.runoff(Question(id=pk, tally_version=version))
+        counts = final_counts(runoff, [choice['id'] for choice in choices])
+        for choice in choices:
+            choice['vote_count'] = counts[choice['id']]
+        data.update(winner=runoff['winner'], ballots=runoff['ballots'])
+    total = sum(choice['vote_count'] for choice in choices)
+    for choice in choices:
+        choice['percentage'] = round(100 * choice['vote_count'] / total, 1) if total else 0.0
+    return revalidate(JsonResponse(dict(data, total=total, choices=choices)))
+
+
+# default span of a time series at each resolution.
+TIMESERIES_SPANS = {VoteRollup.MINUTE: datetime.timedelta(days=1), VoteRollup.HOUR: datetime.timedelta(days=30)}
+
+
+@require_GET
+def timeseries(request, pk):
+    """Return the votes per minute or hour of a question, read from the rollups only.
+
+    ``resolution`` is ``minute`` (the last day by default) or ``hour`` (the
+    last 30 days); ``since`` and ``until`` pick another range. Buckets without
+    votes are left out.
+    """
+    resolution = request.GET.get('resolution', VoteRollup.MINUTE)
+    if resolution not in TIMESERIES_SPANS:
+        return HttpResponseBadRequest(f'resolution must be one of {", ".join(TIMESERIES_SPANS)}.')
+    try:
+        until = parse_range(request.GET.get('until')) or timezone.now()
+        since = parse_range(request.GET.get('since')) or until - TIMESERIES_SPANS[resolution]
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    version = tally_state(request, pk)[0]
+    rows = (VoteRollup.objects.filter(question_id=pk, resolution=resolution, bucket__gte=since, bucket__lt=until)
+            .order_by('bucket', 'choice_id').values_list('bucket', 'choice_id', 'count'))
+    series = []
+    for bucket, choice_id, count in rows:
+        if not series or series[-1]['bucket'] != bucket:
+            series.append({'bucket': bucket, 'total': 0, 'counts': {}})
+        series[-1]['counts'][choice_id] = count
+        series[-1]['total'] += count
+    return revalidate(JsonResponse({'id': pk, 'tally_version': version, 'resolution': resolution,
+                                    'since': since, 'until': until, 'series': series}))
@@ -5,3 +5,7 @@ class PollsConfig(AppConfig):
     """Specific app name = 'polls'."""
 
     name = 'polls'
+
+    def ready(self):
+        """Connect the signal handlers of the polls app."""
+        from . import signals  # noqa: F401
@@ -0,0 +1,107 @@
+"""Serve collected static files, precompressed and cached for good when their name is hashed."""
+import mimetypes
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+# preferred first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class Asset:
+    """A collected file, its precompressed variants and its caching policy."""
+
+    def __init__(self, name, path, immutable):
+        """Stat the file and its variants once."""
+        self.name = name
+        self.path = path
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.variants = {encoding: path + suffix for encoding, suffix in ENCODINGS if os.path.isfile(path + suffix)}
+        stat = os.stat(path)
+        self.etag = f'"{int(stat.st_mtime)}-{stat.st_size}"'
+        self.immutable = immutable
+
+
+class StaticAssetMiddleware:
+    """Answer STATIC_URL requests from STATIC_ROOT before the rest of the stack runs.
+
+    Files listed in the staticfiles manifest have a content hash in their
+    name, so they get ``Cache-Control: public, max-age=POLLS_STATIC_MAX_AGE,
+    immutable`` and repeat visits never ask for them again. Other files are
+    revalidated with an ETag. A ``.br`` or ``.gz`` variant written by
+    collectstatic is sent when the client accepts it.
+    """
+
+    def __init__(self, get_response):
+        """Keep the next handler and start with no known assets."""
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self._assets = {}
+        self._hashed = None
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        """Serve static files, pass everything else on."""
+        if request.path.startswith(self.prefix) and request.method in ('GET', 'HEAD'):
+            asset = self.find(request.path[len(self.prefix):])
+            if asset is not None:
+                return self.serve(request, asset)
+        return self.get_response(request)
+
+    def find(self, name):
+        """Return the Asset for `name`, or None if there is no such collected file."""
+        asset = self._assets.get(name)
+        if asset is None:
+            try:
+                path = safe_join(settings.STATIC_ROOT, name)
+            except (SuspiciousFileOperation, ValueError):
+                return None
+            # unknown names are not remembered, so random URLs cannot grow the map.
+            if not os.path.isfile(path):
+                return None
+            with self._lock:
+                if self._hashed is None:
+                    self._hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+                asset = self._assets[name] = Asset(name, path, name in self._hashed)
+        return asset
+
+    def serve(self, request, asset):
+        """Return the best variant of `asset` for the client, or 304 when it has it."""
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next((encoding for encoding, _ in ENCODINGS
+                         if encoding in accepted and encoding in asset.variants), None)
+        etag = asset.etag if encoding is None else f'{asset.etag[:-1]}-{encoding}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(asset.variants.get(encoding, asset.path), 'rb'),
+                                    content_type=asset.content_type, filename=os.path.basename(asset.name))
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        if asset.immutable:
+            response['Cache-Control'] = f'public, max-age={settings.POLLS_STATIC_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        if asset.variants:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+def accepted_encodings(header):
+    """Return the content codings an Accept-Encoding header allows."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if coding and not (match and float(match.group(1)) == 0):
+            accepted.add(coding.strip().lower())
+    return accepted
@@ -0,0 +1,60 @@
+"""Authentication backend keeping recently seen users in the cache."""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+
+key_prefix = 'polls:user:'
+
+
+def user_cache():
+    """Return the configured cache backend."""
+    return caches[settings.POLLS_USER_CACHE]
+
+
+def forget_user(user_id):
+    """Drop the cached user so that the next request loads it again."""
+    user_cache().delete(f'{key_prefix}{user_id}')
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose per-request user lookup is served from the cache.
+
+    Entries live for POLLS_USER_CACHE_TIMEOUT seconds and are dropped when the
+    user is saved or deleted (see polls/signals.py). With a shared cache a
+    password change ends the other sessions of the user at once; with a
+    per-process cache other workers notice only when their entry expires.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        """Check the credentials like ModelBackend and stop the backend chain when they are wrong.
+
+        ModelBackend follows in AUTHENTICATION_BACKENDS only to load older
+        sessions; trying it too would hash a wrong password a second time.
+        """
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is None and password is not None:
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        """Return the active user with this id, from the cache when possible.
+
+        The cache keeps the fields of the user and its session hash, but not
+        its password hash.
+        """
+        from .models import CachedUser
+
+        key = f'{key_prefix}{user_id}'
+        cached = user_cache().get(key)
+        if cached is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            fields = {field.attname: getattr(user, field.attname) for field in user._meta.concrete_fields
+                      if field.name != 'password'}
+            cached = {'db': user._state.db, 'fields': fields, 'session_auth_hash': user.get_session_auth_hash()}
+            user_cache().set(key, cached, settings.POLLS_USER_CACHE_TIMEOUT)
+        user = CachedUser.from_db(cached['db'], list(cached['fields']), list(cached['fields'].values()))
+        user.session_auth_hash = cached['session_auth_hash']
+        return user if self.user_can_authenticate(user) else None
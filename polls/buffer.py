@@ -0,0 +1,121 @@
+"""Write-behind buffer that batches accepted votes into few database transactions."""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """The vote buffer stayed full for longer than the put timeout."""
+
+
+class VoteBuffer:
+    """Queue validated votes and write them from a background thread.
+
+    Votes are flushed as one transaction per batch, when ``batch_size`` votes
+    are waiting or ``interval`` seconds after the first one, whichever comes
+    first. Within a batch the last vote of a user on a question wins, and one
+    worker consuming the queue in order keeps that true across batches. A batch
+    that fails is retried ``retries`` times and then written vote by vote, so
+    one bad vote or a passing lock error does not lose the rest.
+    """
+
+    _stop = object()
+
+    def __init__(self, max_size=10000, batch_size=500, interval=0.5, put_timeout=1.0, retries=2, retry_delay=0.1):
+        """Create an empty buffer; the worker starts with the first vote."""
+        self.queue = queue.Queue(max_size)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.flushed = 0
+        self.failed = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, question_id, choice_id, user_id):
+        """Queue a vote, raising BufferFull if there is no room after ``put_timeout`` seconds."""
+        self.start()
+        try:
+            self.queue.put((question_id, user_id, choice_id), timeout=self.put_timeout)
+        except queue.Full:
+            raise BufferFull(f'{self.queue.maxsize} votes are waiting to be written') from None
+
+    def start(self):
+        """Start the worker thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='vote-buffer', daemon=True)
+                self._thread.start()
+
+    def drain(self, timeout=None):
+        """Write every queued vote and stop the worker."""
+        # hold the lock until the worker is gone, so a concurrent submit cannot
+        # start a second one that would race it for the rest of the queue.
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None and thread.is_alive():
+                self.queue.put(self._stop)
+                thread.join(timeout)
+
+    def flush(self, batch):
+        """Write a batch of ``(question_id, user_id, choice_id)`` tuples in one transaction."""
+        from .models import Vote
+
+        votes = {}
+        for question_id, user_id, choice_id in batch:
+            votes[question_id, user_id] = choice_id
+        for attempt in range(self.retries + 1):
+            try:
+                Vote.objects.cast_many(votes)
+            except Exception:
+                logger.warning('Could not write %d buffered votes (attempt %d)', len(votes), attempt + 1,
+                               exc_info=True)
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+            else:
+                self.flushed += len(votes)
+                return
+        for key, choice_id in votes.items():
+            try:
+                Vote.objects.cast_many({key: choice_id})
+            except Exception:
+                self.failed += 1
+                logger.exception('Could not write the buffered vote of user %s on question %s', key[1], key[0])
+            else:
+                self.flushed += 1
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                item = self.queue.get()
+                if item is self._stop:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is self._stop:
+                        stopping = True
+                        break
+                    batch.append(item)
+                close_old_connections()
+                self.flush(batch)
+        finally:
+            connection.close()
+
+
+vote_buffer = VoteBuffer(**{key.lower(): value for key, value in settings.POLLS_VOTE_BUFFER.items()})
+atexit.register(vote_buffer.drain)
@@ -0,0 +1,88 @@
+"""Cache of per-question vote tallies for the results pages."""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .routers import primary
+
+
+class ResultsCache:
+    """Keep the tally of each question in a Django cache and count hits and misses."""
+
+    key_prefix = 'polls:results:'
+
+    def __init__(self):
+        """Start with empty hit and miss counters."""
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        """Return the configured cache backend."""
+        return caches[settings.POLLS_RESULTS_CACHE]
+
+    def key(self, question):
+        """Return the cache key of a question's tally at its current tally version."""
+        return f'{self.key_prefix}{question.id}:{question.tally_version}'
+
+    def results(self, question, user=None):
+        """Return ``question.results(user)``, reading the tally from the cache when possible.
+
+        Every vote moves the tally version, so a tally read just before a vote
+        and stored just after it lands under a key that is no longer read.
+        """
+        tallies = self.cache.get(self.key(question))
+        if tallies is None:
+            self._count(hit=False)
+            # a lagging replica must not put a stale tally back into the cache.
+            with primary():
+                rows = question.results(user)
+            self.cache.set(self.key(question),
+                           [{k: row[k] for k in ('id', 'choice_text', 'votes', 'percentage')} for row in rows],
+                           settings.POLLS_RESULTS_CACHE_TIMEOUT)
+            return rows
+        self._count(hit=True)
+        selected = None
+        if user is not None and user.is_authenticated:
+            selected = question.vote_set.filter(user_id=user.id).values_list('choice_id', flat=True).first()
+        return [dict(row, selected=row['id'] == selected) for row in tallies]
+
+    def runoff(self, question):
+        """Return the instant runoff of a ranked question, cached for its current tally version.
+
+        The version is part of the key, so a new ballot makes the next read recount.
+        """
+        from .tally import question_runoff
+
+        key = f'{self.key_prefix}runoff:{question.id}:{question.tally_version}'
+        runoff = self.cache.get(key)
+        self._count(hit=runoff is not None)
+        if runoff is None:
+            with primary():
+                runoff = question_runoff(question.id)
+            self.cache.set(key, runoff, settings.POLLS_RESULTS_CACHE_TIMEOUT)
+        return runoff
+
+    def stats(self):
+        """Return the hit and miss counters of this process."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / lookups, 3) if lookups else 0.0}
+
+    def reset_stats(self):
+        """Reset the hit and miss counters."""
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+results_cache = ResultsCache()
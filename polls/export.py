@@ -0,0 +1,86 @@
+"""Streaming export of raw votes as CSV or newline-delimited JSON."""
+import csv
+import itertools
+import json
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Choice, Vote, VoteArchive
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+FIELDS = ('vote_id', 'question_id', 'question', 'choice_id', 'choice', 'user_id', 'username')
+
+
+class Echo:
+    """File-like object whose write returns the written value, for csv.writer."""
+
+    def write(self, value):
+        """Return `value` instead of storing it."""
+        return value
+
+
+def vote_rows(question_id=None, since=None, until=None, chunk_size=2000):
+    """Yield one tuple of FIELDS per vote, joined with choice text and username in SQL.
+
+    `since` and `until` limit the export to questions published in that range.
+    The votes of archived questions follow the others, without a vote id.
+    """
+    votes = Vote.objects.order_by('id')
+    archives = VoteArchive.objects.select_related('question').order_by('question_id')
+    if question_id is not None:
+        votes = votes.filter(question_id=question_id)
+        archives = archives.filter(question_id=question_id)
+    if since is not None:
+        votes = votes.filter(question__pub_date__gte=since)
+        archives = archives.filter(question__pub_date__gte=since)
+    if until is not None:
+        votes = votes.filter(question__pub_date__lt=until)
+        archives = archives.filter(question__pub_date__lt=until)
+    yield from votes.values_list(
+        'id', 'question_id', 'question__question_text', 'choice_id', 'choice__choice_text',
+        'user_id', 'user__username',
+    ).iterator(chunk_size=chunk_size)
+    for archive in archives.iterator(chunk_size=1):
+        yield from archived_vote_rows(archive, chunk_size)
+
+
+def archived_vote_rows(archive, chunk_size):
+    """Yield the FIELDS tuples of the votes in `archive`, looking up usernames per chunk."""
+    choices = dict(Choice.objects.filter(question_id=archive.question_id).values_list('id', 'choice_text'))
+    rows = archive.rows()
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        usernames = dict(User.objects.filter(id__in={user_id for user_id, _, _ in chunk})
+                         .values_list('id', 'username'))
+        for user_id, choice_id, _ in chunk:
+            yield (None, archive.question_id, archive.question.question_text, choice_id, choices.get(choice_id),
+                   user_id, usernames.get(user_id))
+
+
+def export_lines(rows, fmt):
+    """Yield the export of `rows` line by line in the given format."""
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(FIELDS, row))) + '\n'
+
+
+def parse_range(value):
+    """Return an aware datetime for a date or datetime string, or None if it is empty.
+
+    Raise ValueError for a value that is not a date.
+    """
+    if not value:
+        return None
+    date = parse_datetime(value) or parse_datetime(f'{value}T00:00:00')
+    if date is None:
+        raise ValueError(f'Invalid date: {value!r}')
+    return timezone.make_aware(date) if timezone.is_naive(date) else date
@@ -0,0 +1,58 @@
+"""Logging helpers: a non-blocking rotating file handler and the vote audit log."""
+import atexit
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+audit_logger = logging.getLogger('polls.audit')
+
+
+class _Listener(QueueListener):
+    """Queue listener whose stop waits for room on a full queue."""
+
+    def enqueue_sentinel(self):
+        """Put the stop marker on the queue, blocking while it is full."""
+        self.queue.put(self._sentinel)
+
+
+class QueueListenerHandler(QueueHandler):
+    """Queue log records and write them to a rotating file from a background thread.
+
+    The request thread only formats the record and puts it on a bounded queue;
+    records are dropped (and counted) instead of blocking when the queue is full.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000):
+        """Create the queue and start the listener writing to `filename`."""
+        super().__init__(queue.Queue(queue_size))
+        self.target = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                          encoding='utf-8', delay=True)
+        self.dropped = 0
+        self.listener = _Listener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def enqueue(self, record):
+        """Put the record on the queue without blocking."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out the queued records and stop the listener thread."""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        """Stop the listener and close the file."""
+        self.stop()
+        self.target.close()
+        super().close()
+
+
+def audit(event, **fields):
+    """Write a structured audit event as one JSON line."""
+    if audit_logger.isEnabledFor(logging.INFO):
+        audit_logger.info(json.dumps(dict(event=event, **fields), sort_keys=True, default=str))
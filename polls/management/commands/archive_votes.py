@@ -0,0 +1,42 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from polls.models import Question, ResultSnapshot, VoteArchive
+
+class Command(BaseCommand):
+    """Move the votes of long-closed questions out of the Vote table."""
+
+    help = 'Archive the votes of questions closed longer than the retention window, or restore a question.'
+
+    def add_arguments(self, parser):
+        """Add the retention, batching and restore options."""
+        parser.add_argument('--days', type=int, default=settings.POLLS_ARCHIVE_AFTER_DAYS,
+                            help='Archive questions closed at least this many days ago '
+                                 f'(default: {settings.POLLS_ARCHIVE_AFTER_DAYS}).')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Votes read per query (default: 2000).')
+        parser.add_argument('--restore', type=int, nargs='+', metavar='QUESTION_ID',
+                            help='Put the archived votes of these questions back into the Vote table.')
+
+    def handle(self, *args, **options):
+        """Archive or restore."""
+        if options['restore']:
+            for question_id in options['restore']:
+                try:
+                    archive = VoteArchive.objects.get(question_id=question_id)
+                except VoteArchive.DoesNotExist:
+                    raise CommandError(f'Question {question_id} has no archived votes.')
+                restored = archive.restore(options['batch_size'])
+                self.stdout.write(f'Restored {restored} votes of question {question_id}.')
+            return
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        questions = list(Question.objects.filter(end_date__lte=cutoff, vote_archive__isnull=True,
+                                                 kind=Question.SINGLE).order_by('id').only('id'))
+        # the results page of a closed question reads its snapshot, so make sure there is one.
+        ResultSnapshot.freeze(questions)
+        archived = 0
+        for question in questions:
+            archived += VoteArchive.archive(question, options['batch_size']).count
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} votes of {len(questions)} questions.'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour, TruncMinute
+from django.utils import timezone
+
+from polls.models import Question, Vote, VoteRollup
+
+TRUNCATE = {VoteRollup.MINUTE: TruncMinute, VoteRollup.HOUR: TruncHour}
+
+
+class Command(BaseCommand):
+    """Rebuild the vote rollups from the Vote table."""
+
+    help = 'Recompute the minute and hour vote buckets of questions from their timestamped votes.'
+
+    def add_arguments(self, parser):
+        """Add an optional list of question ids to rebuild."""
+        parser.add_argument('question_ids', nargs='*', type=int,
+                            help='Only rebuild these questions (default: every question with votes).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Buckets inserted per query (default: 1000).')
+
+    def handle(self, *args, **options):
+        """Rebuild the buckets one question at a time."""
+        # archived questions have no Vote rows left; their buckets are kept as they are.
+        questions = Question.objects.filter(vote_archive__isnull=True)
+        if options['question_ids']:
+            questions = questions.filter(id__in=options['question_ids'])
+        else:
+            questions = questions.filter(vote__isnull=False).distinct()
+        rebuilt = buckets = 0
+        for question_id in questions.order_by('id').values_list('id', flat=True).iterator():
+            buckets += self.rebuild(question_id, options['batch_size'])
+            rebuilt += 1
+        untimed = Vote.objects.filter(question__in=questions, voted_at__isnull=True).count()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} buckets of {rebuilt} questions.'))
+        if untimed:
+            self.stdout.write(f'Skipped {untimed} votes cast before votes had timestamps.')
+
+    def rebuild(self, question_id, batch_size):
+        """Replace the buckets of one question with counts grouped in SQL and return how many there are."""
+        rollups = []
+        for resolution, truncate in TRUNCATE.items():
+            rows = (Vote.objects.filter(question_id=question_id, voted_at__isnull=False)
+                    .annotate(bucket=truncate('voted_at', tzinfo=timezone.utc))
+                    .values('choice_id', 'bucket').annotate(count=Count('id')).order_by())
+            rollups.extend(VoteRollup(question_id=question_id, choice_id=row['choice_id'], resolution=resolution,
+                                      bucket=row['bucket'], count=row['count']) for row in rows)
+        with transaction.atomic():
+            VoteRollup.objects.filter(question_id=question_id).delete()
+            VoteRollup.objects.bulk_create(rollups, batch_size=batch_size)
+        return len(rollups)
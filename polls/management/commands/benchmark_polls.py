@@ -0,0 +1,211 @@
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, override_settings, setup_test_environment,
+                               teardown_test_environment)
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Question, Choice, Vote
+
+ENDPOINTS = ('index', 'detail', 'results', 'vote')
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, math.ceil(fraction * len(values)))) - 1]
+
+
+def summarize(samples, elapsed):
+    """Return latency percentiles (ms), throughput and query counts of one endpoint's samples."""
+    latencies = sorted(latency for latency, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'queries_avg': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        'queries_max': max(queries, default=0),
+    }
+
+
+def git_revision():
+    """Return the current git commit, or None outside a repository."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=settings.BASE_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Seed a throwaway database and measure the polls views through the test client."""
+
+    help = 'Benchmark the index, detail, results and vote views on a seeded test database.'
+
+    def add_arguments(self, parser):
+        """Add the seeding and load options."""
+        parser.add_argument('--users', type=int, default=200, help='Users to create (default: 200).')
+        parser.add_argument('--questions', type=int, default=50, help='Questions to create (default: 50).')
+        parser.add_argument('--choices', type=int, default=4, help='Choices per question (default: 4).')
+        parser.add_argument('--votes', type=int, default=5000,
+                            help='Votes to seed, at most one per user and question (default: 5000).')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per endpoint and thread (default: 200).')
+        parser.add_argument('--threads', type=int, default=1, help='Concurrent clients (default: 1).')
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS),
+                            help='Endpoints to measure (default: all).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+        parser.add_argument('--rate-limit', action='store_true',
+                            help='Keep the vote rate limiter on (default: off, so every request reaches the view).')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        """Create the test database, seed it, run the load and report."""
+        self.random = random.Random(options['seed'])
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        old_test = connection.settings_dict['TEST']
+        directory = None
+        if connection.vendor == 'sqlite' and options['threads'] > 1:
+            # threads cannot wait on the table locks of a shared in-memory database.
+            directory = tempfile.mkdtemp()
+            connection.settings_dict['TEST'] = {**old_test, 'NAME': os.path.join(directory, 'benchmark.sqlite3')}
+        try:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            limits = override_settings(POLLS_RATE_LIMIT=dict(settings.POLLS_RATE_LIMIT, ENABLED=options['rate_limit']))
+            limits.enable()
+            try:
+                self.seed(options)
+                report = {
+                    'revision': git_revision(),
+                    'timestamp': timezone.now().isoformat(),
+                    'options': {key: options[key] for key in
+                                ('users', 'questions', 'choices', 'votes', 'requests', 'threads', 'seed')},
+                    'settings': {'DB_PROFILE': settings.DB_PROFILE, 'POLLS_VOTE_MODE': settings.POLLS_VOTE_MODE},
+                    'endpoints': {name: self.measure(name, options) for name in options['endpoints']},
+                }
+            finally:
+                limits.disable()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+        finally:
+            connection.settings_dict['TEST'] = old_test
+            if directory:
+                shutil.rmtree(directory, ignore_errors=True)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+
+    def seed(self, options):
+        """Create the users, questions, choices and votes."""
+        password = make_password('benchmark')
+        User.objects.bulk_create([User(username=f'bench{n}', password=password) for n in range(options['users'])])
+        now = timezone.now()
+        Question.objects.bulk_create([
+            Question(question_text=f'Benchmark question {n}?', pub_date=now - timezone.timedelta(minutes=n),
+                     end_date=now + timezone.timedelta(days=10))
+            for n in range(options['questions'])
+        ])
+        self.question_ids = list(Question.objects.values_list('id', flat=True))
+        Choice.objects.bulk_create([
+            Choice(question_id=question_id, choice_text=f'Choice {n}')
+            for question_id in self.question_ids for n in range(options['choices'])
+        ])
+        self.choices = {}
+        for question_id, choice_id in Choice.objects.values_list('question_id', 'id'):
+            self.choices.setdefault(question_id, []).append(choice_id)
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+        pairs = {(self.random.choice(self.question_ids), self.random.choice(self.user_ids))
+                 for _ in range(options['votes'])}
+        Vote.objects.bulk_create([
+            Vote(question_id=question_id, user_id=user_id, choice_id=self.random.choice(self.choices[question_id]))
+            for question_id, user_id in pairs
+        ], batch_size=1000)
+        Choice.objects.all().recount()
+
+    def measure(self, name, options):
+        """Run the load on one endpoint from every thread and summarize it."""
+        samples = []
+        lock = threading.Lock()
+        clients = []
+        for number in range(options['threads']):
+            client = Client(raise_request_exception=False)
+            client.force_login(User.objects.get(pk=self.user_ids[number % len(self.user_ids)]))
+            clients.append(client)
+
+        def worker(number):
+            rng = random.Random(options['seed'] + number)
+            result = [self.request(clients[number], name, rng) for _ in range(options['requests'])]
+            with lock:
+                samples.extend(result)
+            if options['threads'] > 1:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['threads'])]
+        # failed requests are counted as errors instead of logging a traceback each.
+        logging.disable(logging.ERROR)
+        start = time.perf_counter()
+        try:
+            if options['threads'] == 1:
+                worker(0)
+            else:
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            logging.disable(logging.NOTSET)
+        return summarize(samples, time.perf_counter() - start)
+
+    def request(self, client, name, rng):
+        """Send one request and return its latency, query count and success."""
+        question_id = rng.choice(self.question_ids)
+        with CaptureQueriesContext(connections['default']) as queries:
+            start = time.perf_counter()
+            try:
+                if name == 'index':
+                    response = client.get(reverse('polls:index'))
+                elif name == 'detail':
+                    response = client.get(reverse('polls:detail', args=(question_id,)))
+                elif name == 'results':
+                    response = client.get(reverse('polls:results', args=(question_id,)))
+                else:
+                    response = client.post(reverse('polls:vote', args=(question_id,)),
+                                           {'choice': rng.choice(self.choices[question_id])})
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latency = time.perf_counter() - start
+        return latency, len(queries), ok
+
+    def print_report(self, report):
+        """Print one line per endpoint."""
+        self.stdout.write(f"{'endpoint':<10}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}"
+                          f"{'p99 ms':>9}{'req/s':>9}{'queries':>9}")
+        for name, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{name:<10}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>9.2f}"
+                f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['throughput_rps']:>9.1f}"
+                f"{stats['queries_avg']:>9.1f}"
+            )
@@ -0,0 +1,100 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from polls.models import Question, Vote
+
+
+def profiles():
+    """Return the SQLite profiles of the settings with how each one keeps its connections."""
+    # Only the production profile keeps connections open (CONN_MAX_AGE); the
+    # default one opens a connection per request, i.e. per vote here.
+    return {name: {'pragmas': pragmas, 'persistent': name == 'production'}
+            for name, pragmas in settings.SQLITE_PROFILES.items()}
+
+
+class Command(BaseCommand):
+    """Compare concurrent vote throughput of the SQLite database profiles."""
+
+    help = 'Measure concurrent Vote.objects.cast() throughput on SQLite with each SQLITE_PROFILES entry.'
+
+    def add_arguments(self, parser):
+        """Add the load options."""
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent voters (default: 8).')
+        parser.add_argument('--votes', type=int, default=500, help='Votes per voter (default: 500).')
+        parser.add_argument('--choices', type=int, default=4, help='Choices of the poll (default: 4).')
+
+    def handle(self, *args, **options):
+        """Run the same load against a fresh database per profile and print the results."""
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_sqlite needs the default database to be SQLite.')
+        for name, profile in profiles().items():
+            with tempfile.TemporaryDirectory() as directory:
+                result = self.run_profile(os.path.join(directory, 'bench.sqlite3'), profile, options)
+            self.stdout.write(
+                f"{name:<11} {result['votes']:>7} votes in {result['elapsed']:.2f}s "
+                f"= {result['votes'] / result['elapsed']:>8.0f} votes/sec, {result['errors']} lock errors"
+            )
+
+    def run_profile(self, path, profile, options):
+        """Migrate a database at `path` with the pragmas of `profile`, load it and remove it."""
+        old_name = connection.settings_dict['NAME']
+        old_test = connection.settings_dict['TEST']
+        connection.settings_dict['TEST'] = {**old_test, 'NAME': path}
+        try:
+            with override_settings(SQLITE_PRAGMAS=profile['pragmas']):
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    question, choices, users = self.seed(options)
+                    result = self.run_load(question, choices, users, profile)
+                    question.refresh_from_db()
+                    if question.vote_total != result['votes']:
+                        raise CommandError(f"{question.vote_total} votes counted, {result['votes']} cast")
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            connection.settings_dict['TEST'] = old_test
+        return result
+
+    def seed(self, options):
+        """Create the poll and one user per vote to cast."""
+        question = Question.objects.create(question_text='Benchmark question.')
+        choices = [question.choice_set.create(choice_text=f'Choice {n}') for n in range(options['choices'])]
+        User.objects.bulk_create(User(username=f'voter{n}') for n in range(options['threads'] * options['votes']))
+        users = list(User.objects.order_by('id'))
+        return question, choices, [users[n::options['threads']] for n in range(options['threads'])]
+
+    def run_load(self, question, choices, users, profile):
+        """Cast votes from several threads and return the vote count, errors and elapsed time."""
+        errors = []
+        done = []
+
+        def voter(voters):
+            try:
+                for user in voters:
+                    try:
+                        Vote.objects.cast(question, random.choice(choices), user)
+                        done.append(1)
+                    except OperationalError:
+                        errors.append(1)
+                    finally:
+                        if not profile['persistent']:
+                            connection.close()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=voter, args=(voters,)) for voters in users]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {'votes': len(done), 'errors': len(errors), 'elapsed': time.perf_counter() - start}
@@ -0,0 +1,112 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: import the entry point, then time two rounds of GETs.
+CHILD = r'''
+import asyncio, io, json, sys, time
+entry, urls = sys.argv[1], sys.argv[2:]
+start = time.perf_counter()
+if entry == 'wsgi':
+    from mysite.wsgi import application
+else:
+    from mysite.asgi import application
+imported = time.perf_counter()
+
+
+def get(url):
+    path, _, query = url.partition('?')
+    if entry == 'wsgi':
+        statuses = []
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+        }
+        response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        b''.join(response)
+        response.close()
+        return int(statuses[0].split()[0])
+
+    async def call():
+        messages = []
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                 'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                 'root_path': '', 'headers': [(b'host', b'localhost')], 'server': ('localhost', 80)}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+        await application(scope, receive, send)
+        return messages[0]['status']
+    return asyncio.run(call())
+
+
+rounds = []
+for _ in range(2):
+    timings = {}
+    for url in urls:
+        begin = time.perf_counter()
+        status = get(url)
+        timings[url] = [round((time.perf_counter() - begin) * 1000, 2), status]
+    rounds.append(timings)
+print(json.dumps({'import_ms': round((imported - start) * 1000, 2), 'first': rounds[0], 'second': rounds[1]}))
+'''
+
+
+class Command(BaseCommand):
+    """Measure worker cold starts with and without the warm-up stage."""
+
+    help = 'Time the import of the wsgi/asgi entry point and its first responses, with and without POLLS_WARMUP.'
+
+    def add_arguments(self, parser):
+        """Add the entry point, URL and repetition options."""
+        parser.add_argument('--entry', choices=('wsgi', 'asgi'), default='wsgi',
+                            help='Entry point to import (default: wsgi).')
+        parser.add_argument('--urls', nargs='+', default=['/polls/', '/admin/login/'],
+                            help='URLs requested after the import (default: /polls/ /admin/login/).')
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode (default: 5).')
+        parser.add_argument('--output', help='Write the medians as JSON to this file.')
+
+    def handle(self, *args, **options):
+        """Start fresh interpreters in each mode and report the median timings."""
+        report = {}
+        for mode, warmup in (('cold', 'False'), ('warm', 'True')):
+            runs = [self.run_child(options['entry'], options['urls'], warmup) for _ in range(options['runs'])]
+            report[mode] = {
+                'import_ms': statistics.median(run['import_ms'] for run in runs),
+                'first_ms': {url: statistics.median(run['first'][url][0] for run in runs) for url in options['urls']},
+                'second_ms': {url: statistics.median(run['second'][url][0] for run in runs)
+                              for url in options['urls']},
+                'status': {url: runs[0]['first'][url][1] for url in options['urls']},
+            }
+        self.print_report(report, options['urls'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+
+    def run_child(self, entry, urls, warmup):
+        """Run one fresh interpreter and return its timings."""
+        env = dict(os.environ, POLLS_WARMUP=warmup,
+                   DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'mysite.settings'))
+        result = subprocess.run([sys.executable, '-c', CHILD, entry, *urls], capture_output=True, text=True,
+                                cwd=settings.BASE_DIR, env=env)
+        if result.returncode:
+            raise CommandError(f'The {entry} process failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def print_report(self, report, urls):
+        """Print one line per mode and URL."""
+        self.stdout.write(f"{'mode':<6}{'import ms':>11}  {'url':<20}{'status':>7}{'first ms':>10}{'second ms':>11}")
+        for mode, stats in report.items():
+            for number, url in enumerate(urls):
+                imported = f"{stats['import_ms']:>11.1f}" if number == 0 else ' ' * 11
+                self.stdout.write(f"{mode:<6}{imported}  {url:<20}{stats['status'][url]:>7}"
+                                  f"{stats['first_ms'][url]:>10.1f}{stats['second_ms'][url]:>11.1f}")
@@ -0,0 +1,94 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from polls.tally import RANKING_DTYPE, ballot_matrix, instant_runoff
+
+
+def python_runoff(rankings, weights, choice_count):
+    """Instant runoff with per-ballot Python loops; the reference the NumPy engine is compared to."""
+    active = set(range(choice_count))
+    rounds = []
+    while True:
+        counts = dict.fromkeys(active, 0.0)
+        exhausted = 0.0
+        for ranking, weight in zip(rankings, weights):
+            top = next((column for column in ranking if column in active), None)
+            if top is None:
+                exhausted += weight
+            else:
+                counts[top] += weight
+        result = {'counts': counts, 'exhausted': exhausted, 'eliminated': None}
+        rounds.append(result)
+        continuing = sum(counts.values())
+        if not active or not continuing:
+            return {'winner': None, 'rounds': rounds}
+        leader = max(sorted(active), key=lambda column: counts[column])
+        if counts[leader] * 2 > continuing or len(active) == 1:
+            return {'winner': leader, 'rounds': rounds}
+        loser = min(sorted(active), key=lambda column: counts[column])
+        result['eliminated'] = loser
+        active.discard(loser)
+
+
+class Command(BaseCommand):
+    """Time the NumPy instant runoff engine on synthetic ballots."""
+
+    help = 'Benchmark ranked-choice tallying at 10k, 100k and 1M ballots.'
+
+    def add_arguments(self, parser):
+        """Add the ballot generation options."""
+        parser.add_argument('--ballots', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Ballot counts to measure (default: 10000 100000 1000000).')
+        parser.add_argument('--choices', type=int, default=8, help='Choices of the question (default: 8).')
+        parser.add_argument('--weighted', action='store_true', help='Give every ballot a random weight.')
+        parser.add_argument('--python-limit', type=int, default=100000,
+                            help='Also time the pure Python tally up to this many ballots (default: 100000).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        """Generate ballots for every size, tally them and print the timings."""
+        rng = np.random.default_rng(options['seed'])
+        choice_ids = list(range(1, options['choices'] + 1))
+        report = {}
+        self.stdout.write(f"{'ballots':>9}{'rounds':>8}{'load ms':>10}{'tally ms':>10}{'python ms':>11}")
+        for count in options['ballots']:
+            rankings, weights = self.generate(rng, count, choice_ids, options['weighted'])
+            start = time.perf_counter()
+            matrix = ballot_matrix(rankings, choice_ids)
+            loaded = time.perf_counter()
+            runoff = instant_runoff(matrix, weights, len(choice_ids))
+            tallied = time.perf_counter()
+            stats = {'rounds': len(runoff['rounds']), 'winner': runoff['winner'],
+                     'load_ms': round((loaded - start) * 1000, 2), 'tally_ms': round((tallied - loaded) * 1000, 2),
+                     'python_ms': None}
+            if count <= options['python_limit']:
+                columns = [[column for column in row if column >= 0] for row in matrix.tolist()]
+                start = time.perf_counter()
+                expected = python_runoff(columns, weights.tolist(), len(choice_ids))
+                stats['python_ms'] = round((time.perf_counter() - start) * 1000, 2)
+                if expected['winner'] != runoff['winner']:
+                    self.stderr.write(f'{count} ballots: the Python tally elected {expected["winner"]}, '
+                                      f'the NumPy tally {runoff["winner"]}.')
+            report[count] = stats
+            python_ms = f"{stats['python_ms']:>11.1f}" if stats['python_ms'] is not None else f"{'-':>11}"
+            self.stdout.write(f"{count:>9}{stats['rounds']:>8}{stats['load_ms']:>10.1f}{stats['tally_ms']:>10.1f}"
+                              f"{python_ms}")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+
+    def generate(self, rng, count, choice_ids, weighted):
+        """Return `count` packed random rankings of random length and their weights."""
+        # skewed popularity so that runoffs take several rounds; sorting Gumbel-perturbed
+        # log-popularities draws each ranking without replacement in one vectorized step.
+        popularity = rng.dirichlet(np.ones(len(choice_ids)) * 2)
+        keys = np.log(popularity) + rng.gumbel(size=(count, len(choice_ids)))
+        orders = np.asarray(choice_ids, dtype=RANKING_DTYPE)[np.argsort(-keys, axis=1)]
+        lengths = rng.integers(1, len(choice_ids) + 1, size=count)
+        rankings = [row[:length].tobytes() for row, length in zip(orders, lengths)]
+        weights = rng.uniform(0.5, 2.0, size=count) if weighted else np.ones(count)
+        return rankings, weights
@@ -0,0 +1,45 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from polls.models import Question, ResultSnapshot
+
+
+class Command(BaseCommand):
+    """Freeze the final results of questions whose voting period is over."""
+
+    help = 'Store a ResultSnapshot for every closed question that does not have one yet.'
+
+    def add_arguments(self, parser):
+        """Add the loop and batching options."""
+        parser.add_argument('--loop', action='store_true', help='Keep running and check again every --interval.')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between checks (default: 60).')
+        parser.add_argument('--grace', type=float, default=5,
+                            help='Seconds to wait after end_date so buffered votes land (default: 5).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Questions per batch (default: 500).')
+
+    def handle(self, *args, **options):
+        """Close polls once, or forever with --loop."""
+        while True:
+            closed = self.close_polls(options['grace'], options['batch_size'])
+            if closed or options['verbosity'] > 1:
+                self.stdout.write(f'Froze the results of {closed} questions.')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def close_polls(self, grace, batch_size):
+        """Snapshot the closed questions in batches and return how many were frozen."""
+        cutoff = timezone.now() - datetime.timedelta(seconds=grace)
+        closed = 0
+        while True:
+            # ranked questions are tallied from their ballots, not frozen from votes.
+            questions = list(Question.objects.filter(end_date__lte=cutoff, snapshot__isnull=True,
+                                                     kind=Question.SINGLE)
+                             .order_by('id').only('id')[:batch_size])
+            if not questions:
+                return closed
+            ResultSnapshot.freeze(questions)
+            closed += len(questions)
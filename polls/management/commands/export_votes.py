@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.export import FORMATS, export_lines, parse_range, vote_rows
+
+
+class Command(BaseCommand):
+    """Export raw votes as CSV or newline-delimited JSON."""
+
+    help = 'Stream the votes of a question or of the questions published in a date range.'
+
+    def add_arguments(self, parser):
+        """Add the selection and output options."""
+        parser.add_argument('--question', type=int, help='Only export the votes of this question id.')
+        parser.add_argument('--since', help='Only questions published on or after this date.')
+        parser.add_argument('--until', help='Only questions published before this date.')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='Output format (default: csv).')
+        parser.add_argument('--output', help='File to write (default: standard output).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per query (default: 2000).')
+
+    def handle(self, *args, **options):
+        """Write the export line by line."""
+        try:
+            since = parse_range(options['since'])
+            until = parse_range(options['until'])
+        except ValueError as error:
+            raise CommandError(error)
+        rows = vote_rows(options['question'], since, until, chunk_size=options['chunk_size'])
+        lines = export_lines(rows, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
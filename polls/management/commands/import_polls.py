@@ -0,0 +1,219 @@
+import csv
+import itertools
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from polls.models import Question, Choice, Vote
+
+
+# fields every row of a type must have.
+REQUIRED = {'question': ('question',), 'choice': ('question', 'choice'), 'vote': ('question', 'choice', 'user')}
+
+
+def read_records(path, fmt):
+    """Yield one dict per question, choice or vote row of a JSONL or CSV file.
+
+    A row that cannot be parsed or lacks a required field raises CommandError
+    with its line number before anything of its batch is written.
+    """
+    with open(path, newline='', encoding='utf-8') as source:
+        if fmt == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                record = {key: value for key, value in row.items() if key is not None and value not in (None, '')}
+                yield check_record(reader.line_num, record)
+        else:
+            for number, line in enumerate(source, start=1):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError as error:
+                        raise CommandError(f'Line {number}: invalid JSON ({error})') from None
+                    yield check_record(number, record)
+
+
+def check_record(number, record):
+    """Return `record` if it is a row of a known type with its required fields, else raise CommandError."""
+    if not isinstance(record, dict):
+        raise CommandError(f'Line {number}: expected an object, got {type(record).__name__}')
+    fields = REQUIRED.get(record.get('type'))
+    if fields is None:
+        raise CommandError(f'Line {number}: unknown row type {record.get("type")!r}')
+    missing = [field for field in fields if field not in record]
+    if missing:
+        raise CommandError(f'Line {number}: {record["type"]} row without {", ".join(missing)}')
+    for field in ('pub_date', 'end_date', 'voted_at'):
+        try:
+            parse_date(record.get(field))
+        except CommandError as error:
+            raise CommandError(f'Line {number}: {error}') from None
+    return record
+
+
+def batched(records, size):
+    """Yield lists of at most `size` records."""
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_date(value):
+    """Return an aware datetime from an ISO 8601 string, or None."""
+    if not value:
+        return None
+    date = parse_datetime(value) if isinstance(value, str) else None
+    if date is None:
+        raise CommandError(f'Invalid date: {value!r}')
+    return timezone.make_aware(date) if timezone.is_naive(date) else date
+
+
+class Command(BaseCommand):
+    """Import questions, choices and votes from a JSONL or CSV file.
+
+    Every row has a ``type`` of ``question``, ``choice`` or ``vote``:
+
+    * question: ``question``, optional ``pub_date`` and ``end_date``
+    * choice: ``question`` and ``choice``
+    * vote: ``question``, ``choice`` and ``user`` (a username), optional
+      ``voted_at`` (default: the time of the import)
+
+    Questions and choices are matched by their text, so rows can refer to
+    polls that already exist. A later vote of the same user on the same
+    question replaces the earlier one, as in the vote view.
+    """
+
+    help = 'Stream questions, choices and votes from a JSONL or CSV file into the database.'
+
+    def add_arguments(self, parser):
+        """Add the file, format and batch options."""
+        parser.add_argument('path', help='JSONL or CSV file to import.')
+        parser.add_argument('--format', choices=['jsonl', 'csv'],
+                            help='Input format (default: from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows inserted per transaction (default: 5000).')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Create missing voters as inactive users instead of skipping their votes.')
+
+    def handle(self, *args, **options):
+        """Import the file batch by batch and report the throughput."""
+        fmt = options['format'] or ('csv' if options['path'].endswith('.csv') else 'jsonl')
+        self.create_users = options['create_users']
+        self.questions = {}
+        self.choices = {}
+        self.users = {}
+        self.counts = dict.fromkeys(['question', 'choice', 'vote', 'skipped'], 0)
+        rows = 0
+        start = time.perf_counter()
+        for batch in batched(read_records(options['path'], fmt), options['batch_size']):
+            with transaction.atomic():
+                self.import_batch(batch)
+            rows += len(batch)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{rows} rows, {rows / (time.perf_counter() - start):.0f} rows/sec')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.counts['question']} questions, {self.counts['choice']} choices and "
+            f"{self.counts['vote']} votes ({self.counts['skipped']} rows skipped) from {rows} rows "
+            f"in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/sec)."
+        ))
+
+    def import_batch(self, batch):
+        """Insert the questions, choices and votes of one batch."""
+        by_type = {'question': [], 'choice': [], 'vote': []}
+        for record in batch:
+            by_type[record['type']].append(record)
+        self.import_questions(by_type['question'])
+        self.import_choices(by_type['choice'])
+        self.import_votes(by_type['vote'])
+
+    def import_questions(self, records):
+        """Create the questions that do not exist yet."""
+        texts = {record['question']: record for record in records}
+        self.load_questions(texts)
+        new = []
+        for text, record in texts.items():
+            if text not in self.questions:
+                question = Question(question_text=text)
+                question.pub_date = parse_date(record.get('pub_date')) or question.pub_date
+                question.end_date = parse_date(record.get('end_date')) or question.end_date
+                new.append(question)
+        Question.objects.bulk_create(new)
+        self.load_questions(question.question_text for question in new)
+        self.counts['question'] += len(new)
+
+    def import_choices(self, records):
+        """Create the choices that do not exist yet."""
+        self.load_questions(record['question'] for record in records)
+        keys = set()
+        for record in records:
+            if record['question'] not in self.questions:
+                self.counts['skipped'] += 1
+                continue
+            keys.add((self.questions[record['question']], record['choice']))
+        self.load_choices(question_id for question_id, _ in keys)
+        new = [Choice(question_id=question_id, choice_text=text)
+               for question_id, text in keys if (question_id, text) not in self.choices]
+        Choice.objects.bulk_create(new)
+        self.load_choices({choice.question_id for choice in new}, reload=True)
+        self.counts['choice'] += len(new)
+
+    def import_votes(self, records):
+        """Insert or replace the votes of a batch, keeping the last vote per (question, user)."""
+        self.load_questions(record['question'] for record in records)
+        self.load_choices(self.questions[record['question']] for record in records
+                          if record['question'] in self.questions)
+        self.load_users(record['user'] for record in records)
+        votes = {}
+        times = {}
+        for record in records:
+            question_id = self.questions.get(record['question'])
+            choice_id = self.choices.get((question_id, record['choice']))
+            user_id = self.users.get(record['user'])
+            if choice_id is None or user_id is None:
+                self.counts['skipped'] += 1
+                continue
+            votes[question_id, user_id] = choice_id
+            times[question_id, user_id] = parse_date(record.get('voted_at'))
+        if votes:
+            # the vote path keeps the counters and the time-series buckets in step.
+            Vote.objects.cast_many(votes, times)
+            self.counts['vote'] += len(votes)
+
+    def load_questions(self, texts):
+        """Add the ids of the given question texts to the lookup map."""
+        missing = set(texts) - set(self.questions)
+        if missing:
+            self.questions.update(
+                Question.objects.filter(question_text__in=missing).values_list('question_text', 'id'))
+
+    def load_choices(self, question_ids, reload=False):
+        """Add the choices of the given questions to the lookup map."""
+        question_ids = set(question_ids)
+        if not reload:
+            loaded = {question_id for question_id, _ in self.choices}
+            question_ids -= loaded
+        for question_id, text, choice_id in Choice.objects.filter(
+                question_id__in=question_ids).values_list('question_id', 'choice_text', 'id'):
+            self.choices[question_id, text] = choice_id
+
+    def load_users(self, usernames):
+        """Add the ids of the given usernames to the lookup map, creating them if asked."""
+        missing = set(usernames) - set(self.users)
+        if not missing:
+            return
+        self.users.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+        missing -= set(self.users)
+        if missing and self.create_users:
+            User.objects.bulk_create([User(username=name, is_active=False, password='!') for name in missing])
+            self.users.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+        for name in missing - set(self.users):
+            self.users[name] = None
@@ -0,0 +1,31 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    """Delete expired database sessions in small batches."""
+
+    help = 'Delete expired sessions in batches, so that the session table is never locked for long.'
+
+    def add_arguments(self, parser):
+        """Add the batching options."""
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions per delete (default: 1000).')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches (default: 0).')
+
+    def handle(self, *args, **options):
+        """Delete batches of expired sessions until none are left."""
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(Session.objects.filter(expire_date__lt=now).order_by('expire_date')
+                        .values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions.'))
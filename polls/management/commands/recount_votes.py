@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from polls.models import Choice
+
+
+class Command(BaseCommand):
+    """Rebuild the denormalized vote counters from the Vote table."""
+
+    help = 'Rebuild choice and question vote counters from the Vote table.'
+
+    def add_arguments(self, parser):
+        """Add an optional list of question ids to recount."""
+        parser.add_argument('question_ids', nargs='*', type=int,
+                            help='Only recount these questions (default: all).')
+
+    def handle(self, *args, **options):
+        """Recount the votes in one grouped query."""
+        choices = Choice.objects.all()
+        if options['question_ids']:
+            choices = choices.filter(question_id__in=options['question_ids'])
+        updated = choices.recount()
+        self.stdout.write(self.style.SUCCESS(f'Recounted votes for {updated} choices.'))
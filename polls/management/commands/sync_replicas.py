@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    """Copy the SQLite primary into the SQLite replica stand-ins."""
+
+    help = 'Copy the primary SQLite database into every SQLite replica (local stand-in for replication).'
+
+    def add_arguments(self, parser):
+        """Add the loop options."""
+        parser.add_argument('--loop', action='store_true', help='Keep copying every --interval.')
+        parser.add_argument('--interval', type=float, default=1, help='Seconds between copies (default: 1).')
+
+    def handle(self, *args, **options):
+        """Copy once, or forever with --loop."""
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        replicas = [alias for alias in connections if alias != DEFAULT_DB_ALIAS]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Only SQLite primaries can be copied; use the replication of your database.')
+        for alias in replicas:
+            if connections[alias].settings_dict['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f'Replica {alias} is not an SQLite database.')
+        while True:
+            for alias in replicas:
+                self.copy(primary['NAME'], connections[alias].settings_dict['NAME'])
+                if options['verbosity'] > 1 or not options['loop']:
+                    self.stdout.write(f'Copied the primary into {alias}.')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, source, target):
+        """Copy database `source` into `target` with the online backup API."""
+        source = sqlite3.connect(str(source))
+        target_db = sqlite3.connect(str(target))
+        try:
+            source.backup(target_db)
+        finally:
+            target_db.close()
+            source.close()
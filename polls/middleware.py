@@ -0,0 +1,125 @@
+"""Per-request SQL and timing instrumentation."""
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+slow_query_logger = logging.getLogger('polls.slow_queries')
+
+
+class RequestStats:
+    """Aggregate request timings per URL name."""
+
+    fields = ('queries', 'db_ms', 'view_ms', 'render_ms', 'total_ms')
+
+    def __init__(self):
+        """Start with no recorded requests."""
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, metrics):
+        """Add the metrics of one request to the totals of `name`."""
+        with self._lock:
+            stats = self._stats.setdefault(name, {'count': 0, 'sum': dict.fromkeys(self.fields, 0),
+                                                  'max': dict.fromkeys(self.fields, 0)})
+            stats['count'] += 1
+            for field in self.fields:
+                stats['sum'][field] += metrics[field]
+                stats['max'][field] = max(stats['max'][field], metrics[field])
+
+    def snapshot(self):
+        """Return the request count, averages and maxima of every URL name."""
+        with self._lock:
+            return {
+                name: {
+                    'count': stats['count'],
+                    'avg': {field: round(total / stats['count'], 3) for field, total in stats['sum'].items()},
+                    'max': {field: round(value, 3) for field, value in stats['max'].items()},
+                }
+                for name, stats in self._stats.items()
+            }
+
+    def reset(self):
+        """Forget every recorded request."""
+        with self._lock:
+            self._stats.clear()
+
+
+request_stats = RequestStats()
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries, their time and logging slow ones."""
+
+    def __init__(self, threshold_ms):
+        """Start counting from zero."""
+        self.threshold_ms = threshold_ms
+        self.count = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Run the query and time it."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.elapsed += duration
+            if self.threshold_ms and duration * 1000 >= self.threshold_ms:
+                slow_query_logger.warning('%.1f ms on %s: %s', duration * 1000,
+                                          context['connection'].alias, sql)
+
+
+class TimingMiddleware:
+    """Measure query count, DB time, view time and render time of every request.
+
+    The measurements are sent in a ``Server-Timing`` header and aggregated per
+    URL name in ``request_stats``. Rendering is measured for template responses,
+    which are rendered after the view returns.
+    """
+
+    def __init__(self, get_response):
+        """Keep the next handler."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Time the request and annotate the response."""
+        timer = QueryTimer(settings.POLLS_SLOW_QUERY_MS)
+        request._timing = {}
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        end = time.perf_counter()
+        timing = request._timing
+        view_start = timing.get('view_start', start)
+        view_end = timing.get('view_end', end)
+        metrics = {
+            'queries': timer.count,
+            'db_ms': timer.elapsed * 1000,
+            'view_ms': (view_end - view_start) * 1000,
+            'render_ms': (end - view_end) * 1000 if 'view_end' in timing else 0.0,
+            'total_ms': (end - start) * 1000,
+        }
+        response['Server-Timing'] = (
+            f'db;dur={metrics["db_ms"]:.1f};desc="{timer.count} queries", '
+            f'view;dur={metrics["view_ms"]:.1f}, render;dur={metrics["render_ms"]:.1f}, '
+            f'total;dur={metrics["total_ms"]:.1f}'
+        )
+        match = getattr(request, 'resolver_match', None)
+        request_stats.record(match.view_name if match else 'unresolved', metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Note when the view starts."""
+        request._timing['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """Note when the view returned an unrendered template response."""
+        request._timing['view_end'] = time.perf_counter()
+        return response
@@ -0,0 +1,39 @@
+# Generated by Django 3.1.1 on 2026-10-18 18:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    """Fill the new vote counters from the existing Vote rows."""
+    Question = apps.get_model('polls', 'Question')
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    rows = Vote.objects.values_list('question', 'choice').annotate(total=Count('id')).order_by()
+    totals = {}
+    for question_id, choice_id, total in rows:
+        Choice.objects.filter(pk=choice_id).update(vote_count=total)
+        totals[question_id] = totals.get(question_id, 0) + total
+    for question_id, total in totals.items():
+        Question.objects.filter(pk=question_id).update(vote_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0002_auto_20201027_2042'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='vote_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='vote_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.1.1 on 2026-10-18 18:44
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    """Keep only the latest vote of each user per question and fix the counters."""
+    Question = apps.get_model('polls', 'Question')
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    duplicates = (
+        Vote.objects.exclude(user=None).values('question', 'user')
+        .annotate(latest=Max('id'), total=Count('id')).filter(total__gt=1).order_by()
+    )
+    questions = set()
+    for row in duplicates:
+        Vote.objects.filter(question=row['question'], user=row['user']).exclude(id=row['latest']).delete()
+        questions.add(row['question'])
+    for question_id in questions:
+        total = 0
+        for choice in Choice.objects.filter(question_id=question_id):
+            choice.vote_count = Vote.objects.filter(choice=choice).count()
+            choice.save(update_fields=['vote_count'])
+            total += choice.vote_count
+        Question.objects.filter(pk=question_id).update(vote_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_vote_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('question', 'user'), name='unique_vote_per_user'),
+        ),
+    ]
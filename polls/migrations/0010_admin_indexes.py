@@ -0,0 +1,21 @@
+# Generated by Django 3.1.1 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_vote_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-vote_total', '-id'], name='question_vote_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['question', '-id'], name='vote_question_id_idx'),
+        ),
+    ]
@@ -1,18 +1,121 @@
 import datetime
-from typing import cast
+import sys
+import zlib
+from array import array
+from contextlib import contextmanager
 
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import BooleanField, Case, Count, Exists, F, OuterRef, Value, When
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .pubsub import tally_broker
+from .tally import pack_ranking, unpack_ranking
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def tallies_changed(*question_ids):
+    """Wake the live viewers of these questions after the commit.
+
+    Cached tallies need no dropping: they are keyed on the tally version.
+    """
+    transaction.on_commit(lambda: tally_broker.notify(*question_ids))
+
+
+@contextmanager
+def write_atomic():
+    """Open a vote-writing transaction, begun with SQLITE_TRANSACTION_MODE on SQLite.
+
+    Only these transactions take the write lock up front; read-only atomic
+    blocks elsewhere still begin deferred.
+    """
+    connection = transaction.get_connection()
+    mode = settings.SQLITE_TRANSACTION_MODE
+    if connection.vendor != 'sqlite' or not mode or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    # atomic() opens the outermost transaction through this hook of the SQLite backend.
+    connection._start_transaction_under_autocommit = lambda: connection.cursor().execute(f'BEGIN {mode}')
+    try:
+        with transaction.atomic():
+            del connection._start_transaction_under_autocommit
+            yield
+    finally:
+        connection.__dict__.pop('_start_transaction_under_autocommit', None)
+
+
+class QuestionQuerySet(models.QuerySet):
+    """Queryset for questions filtered by their voting period."""
+
+    def with_status(self, status=None, now=None):
+        """Filter questions by ``open``, ``closed`` or ``upcoming``; any other status keeps the published ones.
+
+        Every question gets an ``is_open`` annotation computed in SQL.
+        """
+        now = now or timezone.now()
+        if status == 'open':
+            questions = self.filter(pub_date__lte=now, end_date__gt=now)
+        elif status == 'closed':
+            questions = self.filter(pub_date__lte=now, end_date__lte=now)
+        elif status == 'upcoming':
+            questions = self.filter(pub_date__gt=now)
+        else:
+            questions = self.filter(pub_date__lte=now)
+        return questions.annotate(is_open=Case(
+            When(pub_date__lte=now, end_date__gt=now, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ))
+
+    def bump_tally(self, delta=0, **fields):
+        """Add `delta` to the vote totals and mark the tallies of these questions as changed.
+
+        Extra `fields` are updated in the same statement.
+        """
+        return self.update(vote_total=F('vote_total') + delta, tally_version=F('tally_version') + 1,
+                           tally_updated_at=timezone.now(), **fields)
+
+    def after(self, pub_date, pk):
+        """Return the questions that come after (`pub_date`, `pk`) in newest-first order."""
+        return self.filter(models.Q(pub_date__lt=pub_date) | models.Q(pub_date=pub_date, pk__lt=pk))
+
 
 class Question(models.Model):
     """Create a question model to use in a polls app."""
 
+    SINGLE = 'single'
+    RANKED = 'ranked'
+    KINDS = [(SINGLE, 'Single choice'), (RANKED, 'Ranked choice (instant runoff)')]
+
     question_text = models.CharField(max_length=200, unique=True)
     pub_date = models.DateTimeField('date published', default=timezone.now)
     # set end_date default to 10 days
     end_date = models.DateTimeField('ending date', default=timezone.now() + datetime.timedelta(days=10))
+    # denormalized number of votes, kept in step with the Vote table by the vote view.
+    vote_total = models.IntegerField(default=0)
+    # changes whenever the tally changes; used for the ETags of the JSON API.
+    tally_version = models.PositiveIntegerField(default=0)
+    tally_updated_at = models.DateTimeField(null=True, blank=True)
+    # changes when the question or one of its choices is edited; keys the index card cache.
+    updated_at = models.DateTimeField(auto_now=True)
+    # single choice polls store Vote rows, ranked ones store Ballot rows.
+    kind = models.CharField(max_length=8, choices=KINDS, default=SINGLE)
+
+    objects = QuestionQuerySet.as_manager()
+
+    STATUSES = ('open', 'closed', 'upcoming')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='question_pub_date_id_idx'),
+            models.Index(fields=['end_date'], name='question_end_date_idx'),
+            # sorting the admin changelist by votes.
+            models.Index(fields=['-vote_total', '-id'], name='question_vote_total_idx'),
+        ]
 
     def __str__(self):
         """Return str of the question text."""
@@ -35,6 +138,32 @@ class Question(models.Model):
         """Check whether user can vote or not."""
         return self.end_date > timezone.now() >= self.pub_date
 
+    def is_closed(self):
+        """Check whether the voting period of this question is over."""
+        return self.end_date <= timezone.now()
+
+    def is_ranked(self):
+        """Check whether voters rank the choices of this question."""
+        return self.kind == self.RANKED
+
+    def results(self, user=None):
+        """Return the tally of every choice and whether `user` picked it, in one query.
+
+        Each row is a dict with the choice ``id``, ``choice_text``, ``votes``,
+        ``percentage`` and ``selected`` keys.
+        """
+        choices = self.choice_set.order_by('id')
+        if user is not None and user.is_authenticated:
+            user_votes = Vote.objects.filter(choice=OuterRef('pk'), user_id=user.id)
+            choices = choices.annotate(selected=Exists(user_votes))
+        else:
+            choices = choices.annotate(selected=Value(False, output_field=BooleanField()))
+        rows = list(choices.values('id', 'choice_text', 'selected', votes=F('vote_count')))
+        total = sum(row['votes'] for row in rows)
+        for row in rows:
+            row['percentage'] = round(100 * row['votes'] / total, 1) if total else 0.0
+        return rows
+
     
     # @property
     # def choices(self):
@@ -45,28 +174,446 @@ class Question(models.Model):
     was_published_recently.short_description = 'Published recently?'
 
 
+class ChoiceQuerySet(models.QuerySet):
+    """Queryset for choices with vote counter maintenance."""
+
+    def recount(self):
+        """Rebuild vote counters of these choices and their questions from the Vote table.
+
+        Questions whose votes are archived keep their counters, and ranked
+        questions count ballots instead.
+        """
+        self = self.filter(question__vote_archive__isnull=True, question__kind=Question.SINGLE)
+        counts = {}
+        totals = {}
+        rows = (
+            Vote.objects.filter(question__in=self.values('question'))
+            .values_list('question', 'choice').annotate(total=Count('id')).order_by()
+        )
+        for question_id, choice_id, total in rows:
+            counts[choice_id] = total
+            totals[question_id] = totals.get(question_id, 0) + total
+        choices = list(self.only('id', 'question_id'))
+        for choice in choices:
+            choice.vote_count = counts.get(choice.id, 0)
+        questions = [Question(id=question_id, vote_total=totals.get(question_id, 0))
+                     for question_id in {choice.question_id for choice in choices}]
+        with transaction.atomic():
+            Choice.objects.bulk_update(choices, ['vote_count'], batch_size=500)
+            Question.objects.bulk_update(questions, ['vote_total'], batch_size=500)
+            Question.objects.filter(pk__in=[question.id for question in questions]).bump_tally()
+            tallies_changed(*(question.id for question in questions))
+        return len(choices)
+
+
 class Choice(models.Model):
     """Create a choice model to use in a polls app."""
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
-    # vote = models.IntegerField(default=0)
-    
+    # denormalized number of votes, kept in step with the Vote table by the vote view.
+    vote_count = models.IntegerField(default=0)
+
+    objects = ChoiceQuerySet.as_manager()
 
     def __str__(self):
         """Return str of choice text."""
         return self.choice_text
 
     def votes(self):
-        return self.question.vote_set.filter(choice=self).count()
+        """Return the number of votes for this choice."""
+        return self.vote_count
+
+class VoteQuerySet(models.QuerySet):
+    """Queryset for votes with the one-vote-per-user upsert."""
+
+    def cast(self, question, choice, user):
+        """Record the vote of `user` for `choice` and keep the vote counters in step.
+
+        The unique (question, user) constraint guarantees one vote per user even
+        when two requests race; the loser of the race updates the winner's row.
+        On SQLite the transaction begins IMMEDIATE (see SQLITE_TRANSACTION_MODE),
+        so reading the previous vote never has to upgrade to a write lock.
+        Return the id of the previously chosen choice, or None for a first vote.
+        """
+        now = timezone.now()
+        with write_atomic():
+            previous, previous_at = self._previous_vote(question, user)
+            if previous is None:
+                try:
+                    with transaction.atomic():
+                        self.create(question=question, choice=choice, user=user, voted_at=now)
+                except IntegrityError:
+                    previous, previous_at = self._previous_vote(question, user)
+                else:
+                    Choice.objects.filter(pk=choice.id).update(vote_count=F('vote_count') + 1)
+                    Question.objects.filter(pk=question.id).bump_tally(1)
+                    VoteRollup.objects.add({(question.id, choice.id, now): 1})
+                    return None
+            if previous != choice.id:
+                self.filter(question=question, user=user).update(choice=choice, voted_at=now)
+                Choice.objects.filter(pk__in=[previous, choice.id]).update(vote_count=Case(
+                    When(pk=choice.id, then=F('vote_count') + 1),
+                    default=F('vote_count') - 1,
+                ))
+                Question.objects.filter(pk=question.id).bump_tally()
+                VoteRollup.objects.add({(question.id, choice.id, now): 1, (question.id, previous, previous_at): -1})
+                tallies_changed(question.id)
+            return previous
+
+    def cast_many(self, votes, times=None):
+        """Record many votes in one transaction and keep the vote counters in step.
+
+        `votes` maps ``(question_id, user_id)`` to the chosen ``choice_id``; the
+        choices must already be validated against their questions. `times`
+        optionally maps the same keys to when the vote was cast (default: now).
+        """
+        choice_deltas = {}
+        question_deltas = {}
+        rollup_deltas = {}
+        now = timezone.now()
+        with write_atomic():
+            existing = {
+                (vote.question_id, vote.user_id): vote
+                for vote in self.select_for_update().filter(
+                    question_id__in={key[0] for key in votes}, user_id__in={key[1] for key in votes}
+                ).only('id', 'question', 'user', 'choice', 'voted_at')
+            }
+            new, changed = [], []
+            for (question_id, user_id), choice_id in votes.items():
+                vote = existing.get((question_id, user_id))
+                voted_at = (times or {}).get((question_id, user_id)) or now
+                if vote is None:
+                    new.append(Vote(question_id=question_id, choice_id=choice_id, user_id=user_id, voted_at=voted_at))
+                    question_deltas[question_id] = question_deltas.get(question_id, 0) + 1
+                elif vote.choice_id != choice_id:
+                    question_deltas.setdefault(question_id, 0)
+                    choice_deltas[vote.choice_id] = choice_deltas.get(vote.choice_id, 0) - 1
+                    key = (question_id, vote.choice_id, vote.voted_at)
+                    rollup_deltas[key] = rollup_deltas.get(key, 0) - 1
+                    vote.choice_id = choice_id
+                    vote.voted_at = voted_at
+                    changed.append(vote)
+                else:
+                    continue
+                choice_deltas[choice_id] = choice_deltas.get(choice_id, 0) + 1
+                key = (question_id, choice_id, voted_at)
+                rollup_deltas[key] = rollup_deltas.get(key, 0) + 1
+            self.bulk_create(new)
+            self.bulk_update(changed, ['choice', 'voted_at'], batch_size=500)
+            for choice_id, delta in choice_deltas.items():
+                if delta:
+                    Choice.objects.filter(pk=choice_id).update(vote_count=F('vote_count') + delta)
+            for question_id, delta in question_deltas.items():
+                Question.objects.filter(pk=question_id).bump_tally(delta)
+            VoteRollup.objects.add(rollup_deltas)
+            tallies_changed(*question_deltas)
+        return len(new), len(changed)
+
+    def _previous_vote(self, question, user):
+        vote = self.select_for_update().filter(question=question, user=user).values_list('choice', 'voted_at').first()
+        return vote or (None, None)
+
 
 class Vote(models.Model):
     """Create a model to track user vote."""
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, null=True, blank=True, 
+    user = models.ForeignKey(User, null=True, blank=True,
                   on_delete=models.CASCADE, default=0)
+    # when the current choice was made; unknown for votes older than the column.
+    voted_at = models.DateTimeField(null=True, blank=True, default=timezone.now)
+
+    objects = VoteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'user'], name='unique_vote_per_user'),
+        ]
+        indexes = [
+            # the newest votes of one question, as listed by the admin.
+            models.Index(fields=['question', '-id'], name='vote_question_id_idx'),
+            # the date hierarchy of the admin.
+            models.Index(fields=['voted_at'], name='vote_voted_at_idx'),
+        ]
+
+
+class BallotQuerySet(models.QuerySet):
+    """Queryset for ranked ballots with the one-ballot-per-user upsert."""
+
+    def cast(self, question, choice_ids, user):
+        """Record the ranking of `user` (choice ids, most preferred first) and return True for a first ballot.
+
+        The choices must already be validated against the question.
+        """
+        ranking = pack_ranking(choice_ids)
+        with write_atomic():
+            created = False
+            if not self.filter(question=question, user=user).update(ranking=ranking):
+                try:
+                    with transaction.atomic():
+                        self.create(question=question, user=user, ranking=ranking)
+                except IntegrityError:
+                    self.filter(question=question, user=user).update(ranking=ranking)
+                else:
+                    created = True
+            Question.objects.filter(pk=question.id).bump_tally(1 if created else 0)
+            tallies_changed(question.id)
+        return created
+
+
+class Ballot(models.Model):
+    """Ranking of the choices of a ranked question by one user."""
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # packed little-endian int32 choice ids, most preferred first (see polls.tally).
+    ranking = models.BinaryField()
+    # multiplies the ballot in the runoff; ballots cast through the views count once.
+    weight = models.FloatField(default=1.0)
+
+    objects = BallotQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'user'], name='unique_ballot_per_user'),
+        ]
+
+    def choice_ids(self):
+        """Return the ranked choice ids, most preferred first."""
+        return unpack_ranking(self.ranking)
+
+
+class VoteRollupQuerySet(models.QuerySet):
+    """Queryset for the vote count buckets."""
+
+    def add(self, deltas):
+        """Add vote count deltas to the minute and hour buckets of their time.
+
+        `deltas` maps ``(question_id, choice_id, voted_at)`` to a count; votes
+        without a time are not rolled up, so taking back an untimed vote has
+        no bucket to leave. All buckets are written by one upsert statement
+        where the database has one.
+        """
+        buckets = {}
+        for (question_id, choice_id, voted_at), delta in deltas.items():
+            if voted_at is None or not delta:
+                continue
+            for resolution in VoteRollup.RESOLUTIONS:
+                key = (question_id, choice_id, resolution, VoteRollup.truncate(voted_at, resolution))
+                buckets[key] = buckets.get(key, 0) + delta
+        buckets = {key: delta for key, delta in buckets.items() if delta}
+        if not buckets:
+            return
+        connection = connections[self.db]
+        if connection.vendor == 'mysql':
+            conflict = 'ON DUPLICATE KEY UPDATE {count} = {count} + VALUES({count})'
+        elif connection.vendor == 'postgresql' or (
+                connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 24)):
+            conflict = ('ON CONFLICT ({choice}, {resolution}, {bucket}) '
+                        'DO UPDATE SET {count} = {table}.{count} + excluded.{count}')
+        else:
+            return self._add_each(buckets)
+        quote = connection.ops.quote_name
+        columns = {name: quote(VoteRollup._meta.get_field(name).column)
+                   for name in ('question', 'choice', 'resolution', 'bucket', 'count')}
+        params = []
+        for (question_id, choice_id, resolution, bucket), delta in buckets.items():
+            params += [question_id, choice_id, resolution, connection.ops.adapt_datetimefield_value(bucket), delta]
+        sql = 'INSERT INTO {table} ({question}, {choice}, {resolution}, {bucket}, {count}) VALUES {rows} ' + conflict
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(table=quote(VoteRollup._meta.db_table),
+                                      rows=', '.join(['(%s, %s, %s, %s, %s)'] * len(buckets)), **columns), params)
+
+    def _add_each(self, buckets):
+        with transaction.atomic(using=self.db):
+            for (question_id, choice_id, resolution, bucket), delta in buckets.items():
+                rollup = self.filter(choice_id=choice_id, resolution=resolution, bucket=bucket)
+                if rollup.update(count=F('count') + delta):
+                    continue
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.create(question_id=question_id, choice_id=choice_id, resolution=resolution,
+                                    bucket=bucket, count=delta)
+                except IntegrityError:
+                    rollup.update(count=F('count') + delta)
+
+
+class VoteRollup(models.Model):
+    """Number of current votes for a choice that were cast within one minute or one hour."""
+
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    RESOLUTIONS = (MINUTE, HOUR)
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=6, choices=[(MINUTE, 'Minute'), (HOUR, 'Hour')])
+    # start of the bucket, in UTC.
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    objects = VoteRollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'resolution', 'bucket'], name='unique_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'resolution', 'bucket'], name='rollup_question_bucket_idx'),
+        ]
+
+    def __str__(self):
+        """Return str of the bucket."""
+        return f'{self.count} votes for {self.choice_id} in the {self.resolution} of {self.bucket}'
+
+    @classmethod
+    def truncate(cls, moment, resolution):
+        """Return the start of the `resolution` bucket holding `moment`."""
+        moment = moment.astimezone(datetime.timezone.utc).replace(second=0, microsecond=0)
+        return moment.replace(minute=0) if resolution == cls.HOUR else moment
+
+
+class ResultSnapshot(models.Model):
+    """Frozen final tally of a closed question."""
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    # list of {"id", "choice_text", "votes", "percentage"} rows, in choice order.
+    tallies = models.JSONField()
+    total = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return str of the snapshot's question."""
+        return f'Final results of {self.question_id}'
+
+    def results(self, user=None):
+        """Return the frozen tally in the format of Question.results()."""
+        selected = None
+        if user is not None and user.is_authenticated:
+            selected = Vote.objects.filter(question_id=self.question_id, user_id=user.id).values_list(
+                'choice_id', flat=True).first()
+            if selected is None:
+                # the votes of a long-closed question may have moved into its archive.
+                archive = VoteArchive.objects.filter(question_id=self.question_id).first()
+                if archive is not None:
+                    selected = archive.choice_of(user.id)
+        return [dict(row, selected=row['id'] == selected) for row in self.tallies]
+
+    @classmethod
+    def freeze(cls, questions):
+        """Compute and store the final tallies of `questions` from the Vote table."""
+        questions = list(questions)
+        counts = dict(
+            Vote.objects.filter(question__in=questions).values('choice')
+            .annotate(total=Count('id')).values_list('choice', 'total').order_by()
+        )
+        choices = {}
+        rows = Choice.objects.filter(question__in=questions).order_by('id').values('id', 'question_id', 'choice_text')
+        for choice in rows:
+            choices.setdefault(choice.pop('question_id'), []).append(choice)
+        snapshots = []
+        for question in questions:
+            rows = choices.get(question.id, [])
+            total = sum(counts.get(row['id'], 0) for row in rows)
+            for row in rows:
+                row['votes'] = counts.get(row['id'], 0)
+                row['percentage'] = round(100 * row['votes'] / total, 1) if total else 0.0
+            snapshots.append(cls(question=question, tallies=rows, total=total))
+        return cls.objects.bulk_create(snapshots, ignore_conflicts=True)
+
+
+class VoteArchive(models.Model):
+    """Votes of a long-closed question, moved out of the Vote table into one compressed blob.
+
+    The blob is the zlib-compressed little-endian int64 sequence
+    ``user_id, choice_id, voted_at, user_id, choice_id, voted_at, ...`` where
+    ``voted_at`` is in microseconds since the Unix epoch; a missing user or
+    time is stored as -1. The vote counters and the result snapshot of the
+    question are left as they are.
+    """
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='vote_archive')
+    votes = models.BinaryField()
+    count = models.IntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Return str of the archive's question."""
+        return f'Archived votes of {self.question_id}'
+
+    @classmethod
+    def archive(cls, question, batch_size=2000):
+        """Move the votes of `question` into an archive, streaming them in batches of `batch_size`.
+
+        The move is one transaction, so a failure leaves the votes where they
+        were; only the compressed output is kept in memory. Batches are
+        deleted without the per-vote signals, and the cached tally of the
+        question is dropped once at the end.
+        """
+        compressor = zlib.compressobj(9)
+        chunks = []
+        count = 0
+        last_id = 0
+        with transaction.atomic():
+            votes = Vote.objects.select_for_update().filter(question=question).order_by('id')
+            while True:
+                batch = list(votes.filter(id__gt=last_id).values_list('id', 'user_id', 'choice_id', 'voted_at')
+                             [:batch_size])
+                if not batch:
+                    break
+                rows = array('q')
+                for _, user_id, choice_id, voted_at in batch:
+                    rows.extend((-1 if user_id is None else user_id, choice_id,
+                                 -1 if voted_at is None else (voted_at - EPOCH) // datetime.timedelta(microseconds=1)))
+                if sys.byteorder == 'big':
+                    rows.byteswap()
+                chunks.append(compressor.compress(rows.tobytes()))
+                last_id = batch[-1][0]
+                count += len(batch)
+                Vote.objects.filter(id__in=[row[0] for row in batch])._raw_delete(Vote.objects.db)
+            chunks.append(compressor.flush())
+            tallies_changed(question.id)
+            return cls.objects.create(question=question, votes=b''.join(chunks), count=count)
+
+    def rows(self):
+        """Yield the archived ``(user_id, choice_id, voted_at)`` votes."""
+        rows = array('q', zlib.decompress(bytes(self.votes)))
+        if sys.byteorder == 'big':
+            rows.byteswap()
+        for index in range(0, len(rows), 3):
+            user_id, choice_id, voted_at = rows[index:index + 3]
+            yield ((None if user_id == -1 else user_id), choice_id,
+                   None if voted_at == -1 else EPOCH + datetime.timedelta(microseconds=voted_at))
+
+    def choice_of(self, user_id):
+        """Return the archived choice id of `user_id`, or None if the user did not vote."""
+        return next((choice_id for voter, choice_id, _ in self.rows() if voter == user_id), None)
+
+    def restore(self, batch_size=2000):
+        """Put the archived votes back into the Vote table, with their times, and delete the archive."""
+        with transaction.atomic():
+            batch = []
+            for user_id, choice_id, voted_at in self.rows():
+                batch.append(Vote(question_id=self.question_id, user_id=user_id, choice_id=choice_id,
+                                  voted_at=voted_at))
+                if len(batch) == batch_size:
+                    Vote.objects.bulk_create(batch)
+                    batch = []
+            Vote.objects.bulk_create(batch)
+            self.delete()
+            tallies_changed(self.question_id)
+        return self.count
+
+
+class CachedUser(User):
+    """User rebuilt from the user cache; its password hash is deferred, so it is only read when used."""
 
+    class Meta:
+        proxy = True
 
-    
\ No newline at end of file
+    def get_session_auth_hash(self):
+        """Return the session hash computed when the user was cached, without loading the password hash."""
+        return self.session_auth_hash
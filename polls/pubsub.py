@@ -0,0 +1,176 @@
+"""In-process pub/sub pushing live tallies to asyncio subscribers."""
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+def fetch_counts(question_id):
+    """Return {choice_id: votes} of a published question, or None if there is no such question.
+
+    A ranked question counts the ballots of each choice in the last runoff round.
+    """
+    from django.utils import timezone
+
+    from .cache import results_cache
+    from .models import Choice, Question
+    from .tally import final_counts
+
+    close_old_connections()
+    try:
+        question = Question.objects.filter(pk=question_id, pub_date__lte=timezone.now()).only(
+            'kind', 'tally_version').first()
+        if question is None:
+            return None
+        counts = dict(Choice.objects.filter(question_id=question_id).values_list('id', 'vote_count'))
+        if question.is_ranked():
+            counts = final_counts(results_cache.runoff(question), counts)
+        return counts
+    finally:
+        close_old_connections()
+
+
+class Subscription:
+    """Tally changes waiting to be sent to one viewer; newer counts overwrite older ones."""
+
+    def __init__(self, counts):
+        """Start with the full tally pending."""
+        self.pending = dict(counts)
+        self.closed = False
+        self.event = asyncio.Event()
+        self.event.set()
+
+    def push(self, delta):
+        """Merge a delta into the pending changes."""
+        self.pending.update(delta)
+        self.event.set()
+
+    def close(self):
+        """End the subscription; ``next`` returns None once the pending changes are sent."""
+        self.closed = True
+        self.event.set()
+
+    async def next(self):
+        """Wait for pending changes and return them, or None if the subscription is closed."""
+        await self.event.wait()
+        self.event.clear()
+        if self.closed and not self.pending:
+            return None
+        if self.closed:
+            self.event.set()
+        delta, self.pending = self.pending, {}
+        return delta
+
+
+class Channel:
+    """Subscribers of one question, refreshed at most ``max_rate`` times per second."""
+
+    def __init__(self, broker, question_id, counts):
+        """Start the refresh task of the channel on the running loop."""
+        self.broker = broker
+        self.question_id = question_id
+        self.counts = counts
+        self.subscribers = set()
+        self.loop = asyncio.get_running_loop()
+        self.dirty = asyncio.Event()
+        self.task = self.loop.create_task(self._run())
+
+    async def _run(self):
+        interval = 1 / self.broker.max_rate
+        while True:
+            await self.dirty.wait()
+            self.dirty.clear()
+            try:
+                counts = await self.broker.load(self.question_id)
+            except Exception:
+                logger.exception('Could not refresh the live tally of question %s', self.question_id)
+                self.close()
+                return
+            if counts is not None:
+                delta = {choice_id: votes for choice_id, votes in counts.items()
+                         if self.counts.get(choice_id) != votes}
+                self.counts = counts
+                if delta:
+                    for subscription in self.subscribers:
+                        subscription.push(delta)
+            await asyncio.sleep(interval)
+
+    def close(self):
+        """Close every subscription and forget the channel, so that viewers reconnect to a new one."""
+        self.broker.forget(self)
+        for subscription in self.subscribers:
+            subscription.close()
+
+
+class TallyBroker:
+    """Fan vote notifications out to the live results viewers of this process.
+
+    ``notify`` may be called from any thread (the vote path runs in worker
+    threads); it only schedules a refresh on the event loop, and refreshes of a
+    question are coalesced so that each one costs a single query however many
+    votes arrived and however many viewers are connected.
+    """
+
+    def __init__(self, max_rate=2, loader=None):
+        """Create a broker sending at most `max_rate` updates per second per question."""
+        self.max_rate = max_rate
+        self.loader = loader or sync_to_async(fetch_counts)
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    async def load(self, question_id):
+        """Return the current {choice_id: votes} of a question, or None if it does not exist."""
+        return await self.loader(question_id)
+
+    async def subscribe(self, question_id):
+        """Return a Subscription to a question, or None if the question does not exist."""
+        channel = self._channels.get(question_id)
+        if channel is None:
+            counts = await self.load(question_id)
+            if counts is None:
+                return None
+            channel = self._channels.get(question_id)
+            if channel is None:
+                channel = Channel(self, question_id, counts)
+                with self._lock:
+                    self._channels[question_id] = channel
+        subscription = Subscription(channel.counts)
+        channel.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, question_id, subscription):
+        """Remove a subscription and close the channel when it was the last one."""
+        channel = self._channels.get(question_id)
+        if channel is None or subscription not in channel.subscribers:
+            return
+        channel.subscribers.discard(subscription)
+        if not channel.subscribers:
+            self.forget(channel)
+            channel.task.cancel()
+
+    def forget(self, channel):
+        """Stop routing notifications to `channel`."""
+        with self._lock:
+            if self._channels.get(channel.question_id) is channel:
+                del self._channels[channel.question_id]
+
+    def notify(self, *question_ids):
+        """Tell the viewers of these questions that their tally changed."""
+        for question_id in question_ids:
+            channel = self._channels.get(question_id)
+            if channel is not None:
+                try:
+                    channel.loop.call_soon_threadsafe(channel.dirty.set)
+                except RuntimeError:
+                    pass
+
+    def subscriber_count(self):
+        """Return the number of connected viewers."""
+        return sum(len(channel.subscribers) for channel in list(self._channels.values()))
+
+
+tally_broker = TallyBroker(max_rate=settings.POLLS_SSE_MAX_RATE)
@@ -0,0 +1,137 @@
+"""In-memory token-bucket admission control for the voting views."""
+import functools
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse
+
+
+@functools.lru_cache(maxsize=8)
+def trusted_networks(proxies):
+    """Return the networks of a tuple of trusted proxy addresses or CIDR ranges."""
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def is_trusted_proxy(ip):
+    """Return whether `ip` belongs to one of the POLLS_TRUSTED_PROXIES."""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_networks(tuple(settings.POLLS_TRUSTED_PROXIES)))
+
+
+def get_client_ip(request):
+    """Return the client IP address.
+
+    X-Forwarded-For is only believed when the request comes from one of the
+    POLLS_TRUSTED_PROXIES; the client is then the last address in it that is
+    not a trusted proxy, since anything to its left was sent by the client.
+    The result is kept on the request so it is only worked out once.
+    """
+    ip = getattr(request, 'client_ip', None)
+    if ip is None:
+        ip = request.META.get('REMOTE_ADDR')
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for and is_trusted_proxy(ip):
+            for hop in reversed([hop.strip() for hop in x_forwarded_for.split(',') if hop.strip()]):
+                ip = hop
+                if not is_trusted_proxy(hop):
+                    break
+        request.client_ip = ip
+    return ip
+
+
+class TokenBucketLimiter:
+    """Token buckets per key, kept in an LRU map of at most ``max_keys`` entries.
+
+    Each bucket is a ``(tokens, last_refill)`` tuple holding up to ``burst``
+    tokens and refilled at ``rate`` tokens per second. When the map is full the
+    least recently used bucket is dropped, which at worst gives that client a
+    fresh burst.
+    """
+
+    def __init__(self, rate, burst, max_keys):
+        """Create an empty limiter."""
+        self.configure(rate, burst, max_keys)
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, rate, burst, max_keys):
+        """Change the refill rate, burst and size of the limiter, keeping its buckets."""
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+
+    def allow(self, key, now=None):
+        """Take a token from the bucket of `key` and return whether there was one."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+            return allowed
+
+    def retry_after(self, key):
+        """Return the whole seconds until `key` has a token again."""
+        with self._lock:
+            tokens, _ = self._buckets.get(key, (self.burst, 0))
+        return max(1, int((1 - tokens) / self.rate + 0.999)) if self.rate else 60
+
+    def stats(self):
+        """Return the counters of the limiter."""
+        with self._lock:
+            return {'allowed': self.allowed, 'rejected': self.rejected, 'evicted': self.evicted,
+                    'tracked_keys': len(self._buckets)}
+
+
+ip_limiter = TokenBucketLimiter(0, 0, 0)
+session_limiter = TokenBucketLimiter(0, 0, 0)
+
+
+def configure_rate_limiters():
+    """Apply POLLS_RATE_LIMIT to the limiters; called at import and when the setting changes."""
+    limits = settings.POLLS_RATE_LIMIT
+    ip_limiter.configure(limits['IP_RATE'], limits['IP_BURST'], limits['MAX_KEYS'])
+    session_limiter.configure(limits['RATE'], limits['BURST'], limits['MAX_KEYS'])
+
+
+configure_rate_limiters()
+
+
+def rate_limited(view):
+    """Answer 429 before the view runs when the client IP or the session has no tokens left.
+
+    The client IP and the session cookie each have their own bucket and both
+    must allow the request, so a client cannot escape its IP bucket by
+    dropping or rotating the cookie. No database query is made.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if settings.POLLS_RATE_LIMIT['ENABLED']:
+            buckets = [(ip_limiter, get_client_ip(request))]
+            session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+            if session_key:
+                buckets.append((session_limiter, session_key))
+            for limiter, key in buckets:
+                if not limiter.allow(key):
+                    response = HttpResponse('Too many requests, please slow down.', status=429)
+                    response['Retry-After'] = str(limiter.retry_after(key))
+                    return response
+        return view(request, *args, **kwargs)
+    return wrapper
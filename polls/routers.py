@@ -0,0 +1,124 @@
+"""Route read-only requests to database replicas and everything else to the primary."""
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# True while the current request may read from a replica; commands, signals and
+# writing requests leave it False and so always use the primary.
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+PIN_COOKIE = 'polls_primary_until'
+
+
+@contextmanager
+def primary():
+    """Send every query of the block to the primary."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaPool:
+    """Round-robin over the replica aliases, skipping the ones that failed a health check."""
+
+    def __init__(self, aliases):
+        """Start with every replica assumed healthy."""
+        self.aliases = list(aliases)
+        self._cycle = itertools.cycle(self.aliases) if self.aliases else None
+        self._lock = threading.Lock()
+        # alias -> time until which the last check result holds.
+        self._checked_until = {}
+        self._down = set()
+
+    def choose(self):
+        """Return the next healthy replica alias, or None to use the primary."""
+        for _ in range(len(self.aliases)):
+            with self._lock:
+                alias = next(self._cycle)
+            if self.healthy(alias):
+                return alias
+        return None
+
+    def healthy(self, alias):
+        """Return whether `alias` answers; the result is kept for POLLS_REPLICA_CHECK_INTERVAL seconds."""
+        now = time.monotonic()
+        if now < self._checked_until.get(alias, 0):
+            return alias not in self._down
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+        except DatabaseError:
+            self._down.add(alias)
+            connections[alias].close()
+        else:
+            self._down.discard(alias)
+        self._checked_until[alias] = now + settings.POLLS_REPLICA_CHECK_INTERVAL
+        return alias not in self._down
+
+    def status(self):
+        """Return {alias: 'up' | 'down'} as last checked."""
+        return {alias: 'down' if alias in self._down else 'up' for alias in self.aliases}
+
+
+replica_pool = ReplicaPool(alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS)
+
+
+class ReplicaRouter:
+    """Read from a replica while the request allows it, write to the primary."""
+
+    def db_for_read(self, model, **hints):
+        """Pick a healthy replica for requests that only read, else the primary."""
+        if _replica_reads.get():
+            return replica_pool.choose() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        """Always write to the primary."""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """The replicas hold the same data as the primary."""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Only migrate the primary; replicas get its schema by replication."""
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Let safe requests read from replicas, except shortly after the client wrote something.
+
+    A request with any other method is served by the primary and sets a cookie
+    pinning the client to the primary for POLLS_REPLICA_PIN_SECONDS, so that
+    it reads its own vote even before the replicas caught up.
+    """
+
+    def __init__(self, get_response):
+        """Keep the next handler."""
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """Route the request and pin writers to the primary."""
+        if not replica_pool.aliases:
+            return self.get_response(request)
+        safe = request.method in ('GET', 'HEAD', 'OPTIONS')
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        token = _replica_reads.set(safe and not pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        if not safe:
+            pin = settings.POLLS_REPLICA_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE, str(time.time() + pin), max_age=pin, httponly=True, samesite='Lax')
+        return response
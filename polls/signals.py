@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .auth import forget_user
+from .models import Question, Choice, Vote, ResultSnapshot, VoteArchive, tallies_changed
+from .ratelimit import configure_rate_limiters
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_results(sender, instance, **kwargs):
+    """Refresh the live viewers of the question once the change is committed."""
+    tallies_changed(instance.question_id)
+
+
+def forget_poll_card(question_id, updated_at):
+    """Drop the cached index cards of a question version, open or not."""
+    cache.delete_many([make_template_fragment_key('poll_card', [question_id, updated_at, is_open])
+                       for is_open in (True, False)])
+
+
+@receiver(pre_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_poll_card(sender, instance, **kwargs):
+    """Drop the index card of a question that is saved or deleted.
+
+    Saving also moves ``updated_at``, so the next render uses a new cache key.
+    """
+    if instance.pk is not None and instance.updated_at is not None:
+        forget_poll_card(instance.pk, instance.updated_at)
+
+
+@receiver(pre_save, sender=Question)
+def unfreeze_results(sender, instance, raw=False, **kwargs):
+    """Drop the final results of a question whose end date moves, e.g. when it is reopened.
+
+    Archived votes are put back first, so close_polls counts them when it
+    freezes the results again after the new end date.
+    """
+    if raw or instance.pk is None:
+        return
+    end_date = Question.objects.filter(pk=instance.pk).values_list('end_date', flat=True).first()
+    if end_date is None or end_date == instance.end_date:
+        return
+    archive = VoteArchive.objects.filter(question_id=instance.pk).first()
+    if archive is not None:
+        archive.restore()
+    ResultSnapshot.objects.filter(question_id=instance.pk).delete()
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def touch_question(sender, instance, **kwargs):
+    """Mark the question of an edited choice as updated and drop its index card.
+
+    The tally version moves too, since the results show the choice texts and
+    the ranked-choice runoffs are cached per version.
+    """
+    updated_at = Question.objects.filter(pk=instance.question_id).values_list('updated_at', flat=True).first()
+    if updated_at is not None:
+        forget_poll_card(instance.question_id, updated_at)
+        Question.objects.filter(pk=instance.question_id).bump_tally(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the cached copy of a user that changed, e.g. a new password or last login."""
+    forget_user(instance.pk)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Run the configured SQLITE_PRAGMAS on a new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    if settings.SQLITE_PRAGMAS:
+        with connection.cursor() as cursor:
+            for name, value in settings.SQLITE_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(setting_changed)
+def reconfigure_rate_limiters(sender, setting, **kwargs):
+    """Apply a changed POLLS_RATE_LIMIT, e.g. under override_settings."""
+    if setting == 'POLLS_RATE_LIMIT':
+        configure_rate_limiters()
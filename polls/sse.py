@@ -0,0 +1,89 @@
+"""Server-Sent Events endpoint streaming live tallies, served directly by the ASGI application."""
+import asyncio
+import json
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from .pubsub import tally_broker
+
+EVENTS_VIEW = 'polls:events'
+
+
+def encode_event(counts):
+    """Return an SSE message with {choice_id: votes} as compact JSON."""
+    return f'data: {json.dumps(counts, separators=(",", ":"))}\n\n'.encode()
+
+
+async def results_events(scope, receive, send, question_id, broker=tally_broker):
+    """Stream the tally of a question: the full counts first, then only the changed ones."""
+    subscription = await broker.subscribe(question_id)
+    if subscription is None:
+        await send({'type': 'http.response.start', 'status': 404,
+                    'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': b'No question matches the given query.'})
+        return
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            while not disconnected.done():
+                update = asyncio.ensure_future(subscription.next())
+                done, _ = await asyncio.wait({update, disconnected}, timeout=settings.POLLS_SSE_HEARTBEAT,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if update in done:
+                    if update.result() is None:
+                        # the channel failed; end the response and let the client reconnect.
+                        await send({'type': 'http.response.body', 'body': b''})
+                        break
+                    body = encode_event(update.result())
+                else:
+                    update.cancel()
+                    if disconnected in done:
+                        break
+                    body = b': ping\n\n'
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            disconnected.cancel()
+    finally:
+        broker.unsubscribe(question_id, subscription)
+
+
+async def wait_for_disconnect(receive):
+    """Return once the client has gone away."""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def events_question(scope):
+    """Return the question id if `scope` requests a results event stream, else None.
+
+    The path is resolved through the URLconf, relative to the ``root_path``
+    the application is mounted at, like Django does for its own requests.
+    """
+    path, root_path = scope['path'], scope.get('root_path', '')
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    return match.kwargs['pk'] if match.view_name == EVENTS_VIEW else None
+
+
+def sse_application(django_application):
+    """Wrap the Django ASGI application so that results event streams bypass it."""
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            question_id = events_question(scope)
+            if question_id is not None:
+                await results_events(scope, receive, send, question_id)
+                return
+        await django_application(scope, receive, send)
+    return application
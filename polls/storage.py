@@ -0,0 +1,51 @@
+"""Static files storage adding precompressed variants to the hashed manifest files."""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz variants are written.
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Write content-hashed copies, then a .gz (and .br) next to every compressible file.
+
+    Variants that do not save at least 5% are skipped; images such as PNGs
+    are already compressed.
+    """
+
+    compress_extensions = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.xml', '.map', '.ico')
+
+    def post_process(self, paths, dry_run=False, **options):
+        """Hash the files like ManifestStaticFilesStorage and compress the results."""
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if not name.endswith(self.compress_extensions):
+                continue
+            for variant in self.compress(name):
+                yield name, variant, True
+
+    def compress(self, name):
+        """Write the compressed variants of `name` and return their names."""
+        with self.open(name) as original:
+            data = original.read()
+        encoders = [('.gz', lambda content: gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            encoders.append(('.br', lambda content: brotli.compress(content, quality=11)))
+        written = []
+        for suffix, encode in encoders:
+            compressed = encode(data)
+            if len(compressed) > len(data) * 0.95:
+                continue
+            target = name + suffix
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(compressed))
+            written.append(target)
+        return written
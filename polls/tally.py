@@ -0,0 +1,120 @@
+"""Vectorized tallying of ranked (instant runoff) and weighted ballots with NumPy."""
+import numpy as np
+
+# Rankings are stored as little-endian int32 choice ids, most preferred first.
+RANKING_DTYPE = np.dtype('<i4')
+
+
+def pack_ranking(choice_ids):
+    """Return the compact binary form of a ranking."""
+    return np.asarray(choice_ids, dtype=RANKING_DTYPE).tobytes()
+
+
+def unpack_ranking(ranking):
+    """Return the choice ids of a packed ranking."""
+    return np.frombuffer(bytes(ranking), dtype=RANKING_DTYPE).tolist()
+
+
+def ballot_matrix(rankings, choice_ids):
+    """Return a (ballots x longest ranking) matrix of choice columns, padded with -1.
+
+    `rankings` are packed rankings and `choice_ids` the sorted ids of the
+    question's choices; column ``i`` stands for ``choice_ids[i]``. Rankings of
+    choices that no longer exist are ignored.
+    """
+    choice_ids = np.asarray(choice_ids, dtype=np.int64)
+    lengths = np.fromiter(map(len, rankings), dtype=np.int64, count=len(rankings)) // RANKING_DTYPE.itemsize
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.full((len(rankings), width), -1, dtype=np.int32)
+    if not width or not len(choice_ids):
+        return matrix
+    # join accepts the bytes and memoryviews that database drivers return for binary fields.
+    flat = np.frombuffer(b''.join(rankings), dtype=RANKING_DTYPE)
+    columns = np.searchsorted(choice_ids, flat)
+    known = columns < len(choice_ids)
+    known[known] = choice_ids[columns[known]] == flat[known]
+    rows = np.repeat(np.arange(len(rankings)), lengths)
+    positions = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    matrix[rows[known], positions[known]] = columns[known]
+    return matrix
+
+
+def _top_choices(matrix, active):
+    """Return the most preferred active column of every ballot, or the exhausted column."""
+    if not matrix.shape[1]:
+        return np.full(len(matrix), len(active) - 1)
+    valid = active[matrix]
+    first = valid.argmax(axis=1)
+    top = matrix[np.arange(len(matrix)), first]
+    top[~valid.any(axis=1)] = len(active) - 1
+    return top
+
+
+def instant_runoff(matrix, weights, choice_count):
+    """Run the elimination rounds of an instant runoff and return them with the winner.
+
+    Each round counts every ballot, times its weight, for its most preferred
+    choice still running; a choice with more than half of the continuing
+    weight wins, otherwise the weakest choice is eliminated (ties go to the
+    lowest column) and only the ballots that ranked it on top are recounted.
+    Return ``{'winner': column or None, 'rounds': [{'counts', 'exhausted', 'eliminated'}]}``.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    exhausted_column = choice_count
+    # the extra column stands for "no choice left": -1 padding indexes it.
+    active = np.ones(choice_count + 1, dtype=bool)
+    active[exhausted_column] = False
+    matrix = np.where(matrix < 0, exhausted_column, matrix)
+    top = _top_choices(matrix, active)
+    counts = np.bincount(top, weights=weights, minlength=choice_count + 1)
+    rounds = []
+    while True:
+        running = np.flatnonzero(active)
+        continuing = counts[running].sum()
+        result = {'counts': {int(column): float(counts[column]) for column in running},
+                  'exhausted': float(counts[exhausted_column]), 'eliminated': None}
+        rounds.append(result)
+        if not len(running) or not continuing:
+            return {'winner': None, 'rounds': rounds}
+        leader = running[counts[running].argmax()]
+        if counts[leader] * 2 > continuing or len(running) == 1:
+            return {'winner': int(leader), 'rounds': rounds}
+        loser = running[counts[running].argmin()]
+        result['eliminated'] = int(loser)
+        active[loser] = False
+        moved = np.flatnonzero(top == loser)
+        top[moved] = _top_choices(matrix[moved], active)
+        counts[loser] = 0
+        counts += np.bincount(top[moved], weights=weights[moved], minlength=choice_count + 1)
+
+
+def tidy(votes):
+    """Show whole weighted counts without decimals."""
+    return int(votes) if float(votes).is_integer() else round(votes, 2)
+
+
+def final_counts(runoff, choice_ids):
+    """Return the last-round count of every choice in `choice_ids`; eliminated and deleted choices count 0."""
+    counts = runoff['rounds'][-1]['counts']
+    return {choice_id: tidy(counts.get(choice_id, 0)) for choice_id in choice_ids}
+
+
+def question_runoff(question_id):
+    """Load the ballots of a question in bulk and return its instant runoff in terms of choice ids."""
+    from .models import Ballot, Choice
+
+    choice_ids = list(Choice.objects.filter(question_id=question_id).order_by('id').values_list('id', flat=True))
+    rankings, weights = [], []
+    for ranking, weight in Ballot.objects.filter(question_id=question_id).values_list(
+            'ranking', 'weight').iterator(chunk_size=5000):
+        rankings.append(ranking)
+        weights.append(weight)
+    runoff = instant_runoff(ballot_matrix(rankings, choice_ids), weights, len(choice_ids))
+    for result in runoff['rounds']:
+        result['counts'] = {choice_ids[column]: votes for column, votes in result['counts'].items()}
+        if result['eliminated'] is not None:
+            result['eliminated'] = choice_ids[result['eliminated']]
+    if runoff['winner'] is not None:
+        runoff['winner'] = choice_ids[runoff['winner']]
+    runoff['ballots'] = len(rankings)
+    return runoff
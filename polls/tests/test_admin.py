@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.models import Question, Vote
+
+
+class AdminChangelistTests(TestCase):
+    """Test that the polls changelists do not query per row."""
+
+    def setUp(self):
+        """Log in a superuser and create votes on a question."""
+        admin = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(admin)
+        self.question = Question.objects.create(question_text='Admin question.')
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+
+    def add_votes(self, count):
+        """Cast `count` votes from new users."""
+        for _ in range(count):
+            user = User.objects.create_user(username=f'voter{User.objects.count()}', password='password')
+            Vote.objects.cast(self.question, self.choice, user)
+
+    def assertConstantQueries(self, url):
+        """Check that the changelist runs as many queries for one row as for five."""
+        self.add_votes(1)
+        # the first request also loads the user into the cache.
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_votes(4)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url)
+        self.assertEqual(len(first), len(second))
+        return response
+
+    def test_question_changelist_shows_votes(self):
+        """The question list shows the vote total."""
+        response = self.assertConstantQueries(reverse('admin:polls_question_changelist'))
+        self.assertContains(response, '<td class="field-total_votes">5</td>', html=True)
+
+    def test_choice_changelist(self):
+        """The choice list fetches the questions in the same query."""
+        self.question.choice_set.create(choice_text='No')
+        self.assertConstantQueries(reverse('admin:polls_choice_changelist'))
+
+    def test_vote_changelist(self):
+        """The vote list fetches questions, choices and users in the same query."""
+        self.assertConstantQueries(reverse('admin:polls_vote_changelist'))
+
+
+class VoteAdminTests(TestCase):
+    """Test that votes cannot be written through the admin."""
+
+    def setUp(self):
+        """Log in a superuser and cast a vote."""
+        admin = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(admin)
+        question = Question.objects.create(question_text='Admin question.')
+        self.vote = Vote.objects.create(question=question, choice=question.choice_set.create(choice_text='Yes'),
+                                        user=admin)
+
+    def test_votes_are_read_only(self):
+        """The vote can be viewed but not added, changed or deleted."""
+        change = reverse('admin:polls_vote_change', args=(self.vote.id,))
+        self.assertEqual(self.client.get(change).status_code, 200)
+        self.assertEqual(self.client.post(change, {'choice': self.vote.choice_id}).status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:polls_vote_add')).status_code, 403)
+        self.assertEqual(self.client.post(reverse('admin:polls_vote_delete', args=(self.vote.id,)),
+                                          {'post': 'yes'}).status_code, 403)
+        self.assertTrue(Vote.objects.filter(pk=self.vote.id).exists())
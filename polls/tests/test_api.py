@@ -0,0 +1,110 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Question, Vote, VoteRollup
+
+
+class ResultsApiTests(TestCase):
+    """Test the JSON results endpoint and its conditional GET."""
+
+    def setUp(self):
+        """Create a published question with two choices."""
+        self.question = Question.objects.create(question_text='API question.',
+                                                pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        self.url = reverse('polls:api_results', args=(self.question.id,))
+
+    def test_results_json(self):
+        """The endpoint returns the counts and percentages of every choice."""
+        user = User.objects.create_user(username='voter', password='password')
+        Vote.objects.cast(self.question, self.second, user)
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual([(c['choice_text'], c['vote_count'], c['percentage']) for c in data['choices']],
+                         [('First', 0, 0.0), ('Second', 1, 100.0)])
+
+    def test_not_modified_until_vote(self):
+        """A matching If-None-Match gets a 304 without reading the choices, until someone votes."""
+        etag = self.client.get(self.url)['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        user = User.objects.create_user(username='voter', password='password')
+        Vote.objects.cast(self.question, self.first, user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Last-Modified', response)
+
+    def test_choice_change_modifies_results(self):
+        """Renaming, adding or deleting a choice changes the ETag, so clients do not keep stale results."""
+        etags = [self.client.get(self.url)['ETag']]
+        self.first.choice_text = 'Renamed'
+        self.first.save()
+        etags.append(self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[-1])['ETag'])
+        third = self.question.choice_set.create(choice_text='Third')
+        etags.append(self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[-1])['ETag'])
+        third.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[-1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(set(etags + [response['ETag']])), 4)
+        self.assertEqual([c['choice_text'] for c in response.json()['choices']], ['Renamed', 'Second'])
+
+    def test_unpublished_question(self):
+        """Questions that are not published yet are not found."""
+        future = Question.objects.create(question_text='Future API question.',
+                                         pub_date=timezone.now() + datetime.timedelta(days=1))
+        response = self.client.get(reverse('polls:api_results', args=(future.id,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class QuestionsApiTests(TestCase):
+    """Test the JSON question list."""
+
+    def test_list_and_etag(self):
+        """The list returns published questions and honours If-None-Match."""
+        Question.objects.create(question_text='Listed question.', pub_date=timezone.now() - datetime.timedelta(days=1))
+        url = reverse('polls:api_questions')
+        response = self.client.get(url)
+        self.assertEqual([row['question_text'] for row in response.json()['questions']], ['Listed question.'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class TimeseriesApiTests(TestCase):
+    """Test the vote time series endpoint."""
+
+    def setUp(self):
+        """Create a published question with two choices."""
+        self.question = Question.objects.create(question_text='Series question.',
+                                                pub_date=timezone.now() - datetime.timedelta(days=1))
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        self.url = reverse('polls:api_timeseries', args=(self.question.id,))
+
+    def test_series_from_rollups(self):
+        """Buckets are grouped per time with per-choice counts, without reading the Vote table."""
+        hour = VoteRollup.truncate(timezone.now(), VoteRollup.HOUR)
+        for choice, offset, count in ((self.first, 2, 3), (self.second, 2, 1), (self.first, 1, 4)):
+            VoteRollup.objects.create(question=self.question, choice=choice, resolution=VoteRollup.HOUR,
+                                      bucket=hour - datetime.timedelta(hours=offset), count=count)
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url, {'resolution': 'hour'}).json()
+        self.assertEqual([(row['total'], row['counts']) for row in data['series']],
+                         [(4, {str(self.first.id): 3, str(self.second.id): 1}), (4, {str(self.first.id): 4})])
+
+    def test_vote_shows_up_in_minute_series(self):
+        """A vote is counted in the current minute."""
+        user = User.objects.create_user(username='voter', password='password')
+        Vote.objects.cast(self.question, self.second, user)
+        series = self.client.get(self.url).json()['series']
+        self.assertEqual([row['counts'] for row in series], [{str(self.second.id): 1}])
+
+    def test_bad_resolution(self):
+        """Unknown resolutions are rejected."""
+        self.assertEqual(self.client.get(self.url, {'resolution': 'week'}).status_code, 400)
@@ -0,0 +1,78 @@
+import gzip
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from polls.assets import StaticAssetMiddleware, accepted_encodings
+
+
+class StaticPipelineTests(SimpleTestCase):
+    """Test collectstatic with the compressed manifest storage and the serving middleware."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Collect the static files into a temporary STATIC_ROOT."""
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.settings = override_settings(STATIC_ROOT=cls.root,
+                                         STATICFILES_STORAGE='polls.storage.CompressedManifestStaticFilesStorage')
+        cls.settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0, stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the collected files."""
+        cls.settings.disable()
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """Wrap a view that must never be reached for static files."""
+        self.middleware = StaticAssetMiddleware(lambda request: HttpResponse('app'))
+        self.factory = RequestFactory()
+        self.css = staticfiles_storage.stored_name('polls/style.css')
+
+    def get(self, name, **headers):
+        """Request a static file through the middleware."""
+        return self.middleware(self.factory.get(f'/static/{name}', **headers))
+
+    def test_hashed_file_is_immutable_and_precompressed(self):
+        """Hashed CSS is sent gzipped with far-future caching."""
+        self.assertRegex(self.css, r'^polls/style\.[0-9a-f]{12}\.css$')
+        response = self.get(self.css, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        css = gzip.decompress(b''.join(response.streaming_content))
+        self.assertIn(b'background', css)
+        # the image URL in the stylesheet was rewritten to its hashed name.
+        self.assertIn(staticfiles_storage.stored_name('polls/images/background.png').split('/')[-1].encode(), css)
+
+    def test_revalidation_and_identity(self):
+        """Clients without gzip get the plain file, and a matching ETag gets a 304."""
+        response = self.get(self.css)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(self.get(self.css, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_unhashed_file_is_revalidated(self):
+        """Files requested by their original name must be revalidated."""
+        response = self.get('polls/style.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=0, must-revalidate')
+
+    def test_png_is_not_compressed_and_missing_files_fall_through(self):
+        """Images are served as they are and unknown paths reach the application."""
+        response = self.get(staticfiles_storage.stored_name('polls/images/background.png'),
+                            HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(self.get('polls/missing.css').content, b'app')
+        self.assertEqual(self.get('../settings.py').content, b'app')
+
+    def test_accepted_encodings(self):
+        """Codings with q=0 are refused."""
+        self.assertEqual(accepted_encodings('gzip;q=0.5, br;q=0, identity'), {'gzip', 'identity'})
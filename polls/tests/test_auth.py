@@ -1,8 +1,18 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
 from django.test import TestCase
 from django.contrib.auth.models import User
 from polls.views import *
 
-
 class AuthTest(TestCase):
     """Test authentication in polls app."""
 
@@ -42,3 +52,66 @@ class AuthTest(TestCase):
             'username': 'hacker',
             'password': 'f34cwx3'}, follow=True)
         self.assertFalse(response.context['user'].is_active)
+
+
+class CachedUserTests(TestCase):
+    """Test the cached user lookup and the session settings."""
+
+    def setUp(self):
+        """Log a user in with an empty cache."""
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', password='password')
+        self.client.login(username='cached', password='password')
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_warm_request_runs_no_auth_queries(self):
+        """Once the session and the user are cached a request reads neither table."""
+        self.client.login(username='cached', password='password')
+        url = reverse('polls:index')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+        self.assertFalse([query for query in queries
+                          if 'auth_user' in query['sql'] or 'django_session' in query['sql']])
+
+    def test_cache_keeps_no_password_hash(self):
+        """The cache keeps no password hash, yet sessions, password checks and saves of the cached user work."""
+        self.client.get(reverse('polls:index'))
+        self.assertNotIn(self.user.password, repr(cache.get(f'polls:user:{self.user.id}')))
+        response = self.client.get(reverse('polls:index'))
+        user = response.context['user']
+        self.assertEqual(user, self.user)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertTrue(user.check_password('password'))
+        user.first_name = 'Cached'
+        user.save()
+        self.assertTrue(authenticate(username='cached', password='password'))
+
+    def test_saving_user_drops_cache(self):
+        """A password change logs the other sessions out at once."""
+        self.client.get(reverse('polls:index'))
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_model_backend_sessions_still_load(self):
+        """Sessions logged in through ModelBackend keep their user."""
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('polls:index'))
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_wrong_password_checked_once(self):
+        """A wrong password is not checked again by the ModelBackend that follows."""
+        with mock.patch.object(User, 'check_password', return_value=False) as check_password:
+            self.assertIsNone(authenticate(username='cached', password='wrong'))
+        self.assertEqual(check_password.call_count, 1)
+
+    def test_purge_sessions(self):
+        """Expired sessions are deleted and live ones kept."""
+        Session.objects.create(session_key='expired', session_data='',
+                               expire_date=timezone.now() - datetime.timedelta(days=1))
+        call_command('purge_sessions', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)),
+                         [self.client.session.session_key])
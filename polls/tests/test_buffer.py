@@ -0,0 +1,122 @@
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from polls.buffer import VoteBuffer, vote_buffer
+from polls.models import Question, Vote
+
+
+class VoteBufferFlushTests(TestCase):
+    """Test writing a batch of buffered votes."""
+
+    def setUp(self):
+        """Create a question with two choices and two users."""
+        self.question = Question.objects.create(question_text='Buffered question.')
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+
+    def test_last_vote_wins(self):
+        """Only the last vote of each user in a batch is kept and counted."""
+        Vote.objects.cast(self.question, self.first, self.bob)
+        VoteBuffer().flush([
+            (self.question.id, self.alice.id, self.first.id),
+            (self.question.id, self.alice.id, self.second.id),
+            (self.question.id, self.bob.id, self.second.id),
+        ])
+        self.assertEqual(set(Vote.objects.values_list('user__username', 'choice__choice_text')),
+                         {('alice', 'Second'), ('bob', 'Second')})
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.question.refresh_from_db()
+        self.assertEqual((self.first.vote_count, self.second.vote_count, self.question.vote_total), (0, 2, 2))
+
+    def test_failed_batch_is_retried(self):
+        """A batch that fails once is written by the retry."""
+        buffer = VoteBuffer(retry_delay=0)
+        cast_many = Vote.objects.cast_many
+        outcomes = iter([OperationalError('database is locked')])
+
+        def locked_once(votes):
+            for error in outcomes:
+                raise error
+            return cast_many(votes)
+
+        with mock.patch.object(Vote.objects, 'cast_many', side_effect=locked_once):
+            with self.assertLogs('polls.buffer', 'WARNING'):
+                buffer.flush([(self.question.id, self.alice.id, self.first.id)])
+        self.assertEqual((buffer.flushed, buffer.failed), (1, 0))
+        self.assertTrue(Vote.objects.filter(user=self.alice).exists())
+
+    def test_bad_vote_does_not_lose_the_batch(self):
+        """When a batch keeps failing its votes are written one by one and only the bad one is lost."""
+        buffer = VoteBuffer(retries=1, retry_delay=0)
+        cast_many = Vote.objects.cast_many
+
+        def fail_with_bob(votes):
+            if (self.question.id, self.bob.id) in votes:
+                raise OperationalError('bad vote')
+            return cast_many(votes)
+
+        with mock.patch.object(Vote.objects, 'cast_many', side_effect=fail_with_bob):
+            with self.assertLogs('polls.buffer', 'ERROR'):
+                buffer.flush([
+                    (self.question.id, self.alice.id, self.first.id),
+                    (self.question.id, self.bob.id, self.second.id),
+                ])
+        self.assertEqual((buffer.flushed, buffer.failed), (1, 1))
+        self.assertEqual(list(Vote.objects.values_list('user__username', flat=True)), ['alice'])
+
+
+class VoteBufferWorkerTests(TransactionTestCase):
+    """Test the background worker of the vote buffer."""
+
+    def setUp(self):
+        """Create a question with a choice and log a user in."""
+        self.question = Question.objects.create(question_text='Worker question.')
+        self.choice = self.question.choice_set.create(choice_text='Only')
+        self.user = User.objects.create_user(username='voter', password='password')
+
+    def test_drain_writes_queued_votes(self):
+        """Draining the buffer writes every queued vote."""
+        buffer = VoteBuffer(batch_size=10, interval=0.01)
+        buffer.submit(self.question.id, self.choice.id, self.user.id)
+        buffer.drain(timeout=5)
+        self.assertEqual(buffer.flushed, 1)
+        self.assertTrue(Vote.objects.filter(question=self.question, user=self.user).exists())
+
+    def test_submit_during_drain_waits_for_the_worker(self):
+        """A vote submitted while the buffer drains does not start a second worker next to the old one."""
+        buffer = VoteBuffer(batch_size=1)
+        release = threading.Event()
+        with mock.patch.object(buffer, 'flush', side_effect=lambda batch: release.wait(5)):
+            buffer.submit(self.question.id, self.choice.id, self.user.id)
+            drainer = threading.Thread(target=buffer.drain, kwargs={'timeout': 5})
+            drainer.start()
+            deadline = time.monotonic() + 5
+            while buffer.queue.qsize() < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            starter = threading.Thread(target=buffer.start)
+            starter.start()
+            starter.join(0.1)
+            self.assertEqual([thread.name for thread in threading.enumerate()].count('vote-buffer'), 1)
+            release.set()
+            drainer.join(5)
+            starter.join(5)
+            buffer.drain(timeout=5)
+
+    @override_settings(POLLS_VOTE_MODE='buffered')
+    def test_buffered_vote_view(self):
+        """In buffered mode the vote view queues the vote and redirects to the results."""
+        self.client.login(username='voter', password='password')
+        response = self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)))
+        vote_buffer.drain(timeout=5)
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.vote_total, 1)
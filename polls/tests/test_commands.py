@@ -0,0 +1,238 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.management.commands.benchmark_polls import summarize
+from polls.models import Question, Vote, VoteArchive, VoteRollup
+
+
+class RecountVotesCommandTests(TestCase):
+    """Test the recount_votes management command."""
+
+    def test_recount_votes(self):
+        """The command repairs counters that drifted from the Vote table."""
+        question = Question.objects.create(question_text='Drifted question.', vote_total=10)
+        choice = question.choice_set.create(choice_text='Only', vote_count=10)
+        user = User.objects.create_user(username='voter', password='password')
+        Vote.objects.create(question=question, choice=choice, user=user)
+        out = StringIO()
+        call_command('recount_votes', stdout=out)
+        choice.refresh_from_db()
+        question.refresh_from_db()
+        self.assertEqual((choice.vote_count, question.vote_total), (1, 1))
+        self.assertIn('Recounted votes for 1 choices.', out.getvalue())
+
+
+class ImportPollsCommandTests(TestCase):
+    """Test the import_polls management command."""
+
+    def setUp(self):
+        """Create an existing voter."""
+        User.objects.create_user(username='alice', password='password')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        """Write an input file and return its path."""
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write(content)
+        return path
+
+    def test_import_jsonl(self):
+        """Questions, choices and votes are imported; the last vote of a user wins."""
+        rows = [
+            {'type': 'question', 'question': 'Imported?', 'pub_date': '2020-01-01T00:00:00'},
+            {'type': 'choice', 'question': 'Imported?', 'choice': 'Yes'},
+            {'type': 'choice', 'question': 'Imported?', 'choice': 'No'},
+            {'type': 'vote', 'question': 'Imported?', 'choice': 'Yes', 'user': 'alice'},
+            {'type': 'vote', 'question': 'Imported?', 'choice': 'No', 'user': 'alice'},
+            {'type': 'vote', 'question': 'Imported?', 'choice': 'Yes', 'user': 'nobody'},
+        ]
+        path = self.write('polls.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        out = StringIO()
+        call_command('import_polls', path, '--batch-size', '2', stdout=out)
+        question = Question.objects.get(question_text='Imported?')
+        self.assertEqual(question.pub_date.year, 2020)
+        self.assertEqual(Vote.objects.get(question=question).choice.choice_text, 'No')
+        self.assertEqual([(row['choice_text'], row['votes']) for row in question.results()], [('Yes', 0), ('No', 1)])
+        # the vote changed in a later batch moved to the bucket of its new choice.
+        self.assertEqual(question.vote_total, 1)
+        for resolution in VoteRollup.RESOLUTIONS:
+            self.assertEqual(sorted(VoteRollup.objects.filter(question=question, resolution=resolution)
+                                    .exclude(count=0).values_list('choice__choice_text', 'count')), [('No', 1)])
+        self.assertIn('Imported 1 questions, 2 choices and 2 votes (1 rows skipped)', out.getvalue())
+
+    def test_import_csv_creates_users(self):
+        """CSV rows are imported and unknown voters are created when asked."""
+        path = self.write('polls.csv', 'type,question,choice,user\n'
+                                       'question,CSV?,,\n'
+                                       'choice,CSV?,Sure,\n'
+                                       'vote,CSV?,Sure,kiosk-1\n')
+        call_command('import_polls', path, '--create-users', stdout=StringIO())
+        question = Question.objects.get(question_text='CSV?')
+        self.assertEqual(question.vote_total, 1)
+        self.assertFalse(User.objects.get(username='kiosk-1').is_active)
+
+    def test_import_keeps_voted_at(self):
+        """A vote row's voted_at is kept on the vote and in its time-series bucket."""
+        path = self.write('polls.jsonl', '\n'.join(json.dumps(record) for record in [
+            {'type': 'question', 'question': 'When?'},
+            {'type': 'choice', 'question': 'When?', 'choice': 'Then'},
+            {'type': 'vote', 'question': 'When?', 'choice': 'Then', 'user': 'alice',
+             'voted_at': '2020-03-01T10:15:00+00:00'},
+        ]))
+        call_command('import_polls', path, stdout=StringIO())
+        voted_at = datetime.datetime(2020, 3, 1, 10, 15, tzinfo=datetime.timezone.utc)
+        self.assertEqual(Vote.objects.get().voted_at, voted_at)
+        buckets = set(VoteRollup.objects.values_list('bucket', flat=True))
+        self.assertEqual(buckets, {voted_at, voted_at.replace(minute=0)})
+
+    def test_bad_json_line_is_reported(self):
+        """A line that is not JSON stops the import with its line number."""
+        path = self.write('polls.jsonl', '{"type": "question", "question": "Fine?"}\n{"type": "choice",\n')
+        with self.assertRaisesMessage(CommandError, 'Line 2: invalid JSON'):
+            call_command('import_polls', path, stdout=StringIO())
+
+    def test_row_without_required_field_is_reported(self):
+        """A CSV vote whose user cell is empty stops the import with its line number."""
+        path = self.write('polls.csv', 'type,question,choice,user\n'
+                                       'question,CSV?,,\n'
+                                       'vote,CSV?,Sure,\n')
+        with self.assertRaisesMessage(CommandError, 'Line 3: vote row without user'):
+            call_command('import_polls', path, stdout=StringIO())
+
+
+class BenchmarkSQLiteCommandTests(SimpleTestCase):
+    """Test the benchmark_sqlite management command."""
+
+    def test_reports_every_profile(self):
+        """The benchmark prints one line per database profile with every vote cast."""
+        # the command creates and destroys its own databases, so keep it away from the test one.
+        result = subprocess.run([sys.executable, 'manage.py', 'benchmark_sqlite', '--threads', '2', '--votes', '5'],
+                                capture_output=True, text=True, cwd=settings.BASE_DIR, check=True)
+        lines = result.stdout.splitlines()
+        self.assertEqual([line.split()[0] for line in lines], list(settings.SQLITE_PROFILES))
+        self.assertTrue(all('10 votes' in line and '0 lock errors' in line for line in lines))
+
+
+class ExportVotesCommandTests(TestCase):
+    """Test the export_votes management command."""
+
+    def test_export_to_stdout(self):
+        """The command writes one JSON line per vote of the question."""
+        question = Question.objects.create(question_text='Exported question.')
+        choice = question.choice_set.create(choice_text='Only')
+        user = User.objects.create_user(username='voter', password='password')
+        vote = Vote.objects.create(question=question, choice=choice, user=user)
+        out = StringIO()
+        call_command('export_votes', '--question', str(question.id), '--format', 'jsonl', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows, [{'vote_id': vote.id, 'question_id': question.id, 'question': 'Exported question.',
+                                 'choice_id': choice.id, 'choice': 'Only', 'user_id': user.id,
+                                 'username': 'voter'}])
+
+
+class BenchmarkPollsSummaryTests(SimpleTestCase):
+    """Test the statistics of the benchmark_polls command."""
+
+    def test_summarize(self):
+        """Percentiles, throughput, errors and query counts are computed from the samples."""
+        samples = [(n / 1000, n % 3, n != 100) for n in range(1, 101)]
+        stats = summarize(samples, elapsed=2.0)
+        self.assertEqual((stats['p50_ms'], stats['p95_ms'], stats['p99_ms']), (50.0, 95.0, 99.0))
+        self.assertEqual((stats['requests'], stats['errors'], stats['throughput_rps']), (100, 1, 50.0))
+        self.assertEqual((stats['queries_avg'], stats['queries_max']), (1.0, 2))
+
+
+class ArchiveVotesCommandTests(TestCase):
+    """Test the archive_votes management command."""
+
+    def test_archive_and_restore(self):
+        """Old closed questions lose their Vote rows but keep their tally, and can be restored with their times."""
+        old = Question.objects.create(question_text='Old question.',
+                                      pub_date=timezone.now() - datetime.timedelta(days=200),
+                                      end_date=timezone.now() - datetime.timedelta(days=100))
+        recent = Question.objects.create(question_text='Recent question.',
+                                         end_date=timezone.now() - datetime.timedelta(days=1))
+        users = [User.objects.create_user(username=f'voter{n}', password='password') for n in range(3)]
+        for question in (old, recent):
+            yes = question.choice_set.create(choice_text='Yes')
+            no = question.choice_set.create(choice_text='No')
+            for user, choice in zip(users, (yes, yes, no)):
+                Vote.objects.cast(question, choice, user)
+        Vote.objects.filter(question=old, user=users[2]).update(voted_at=None)
+        rows = sorted(Vote.objects.filter(question=old).values_list('user_id', 'choice_id', 'voted_at'))
+
+        call_command('archive_votes', '--days', '30', '--batch-size', '2', stdout=StringIO())
+        self.assertFalse(Vote.objects.filter(question=old).exists())
+        self.assertEqual(Vote.objects.filter(question=recent).count(), 3)
+        self.assertEqual(sorted(VoteArchive.objects.get(question=old).rows()), rows)
+        self.assertEqual([row['votes'] for row in old.snapshot.results()], [2, 1])
+        old.choice_set.recount()
+        self.assertEqual([row['votes'] for row in old.results()], [2, 1])
+
+        call_command('archive_votes', '--restore', str(old.id), stdout=StringIO())
+        self.assertEqual(sorted(Vote.objects.filter(question=old).values_list('user_id', 'choice_id', 'voted_at')),
+                         rows)
+        self.assertFalse(VoteArchive.objects.exists())
+
+    def test_archive_deletes_without_vote_signals(self):
+        """Archiving queues one cache invalidation for the question, not one per vote."""
+        question = Question.objects.create(question_text='Busy question.',
+                                           end_date=timezone.now() - datetime.timedelta(days=100))
+        choice = question.choice_set.create(choice_text='Only')
+        users = User.objects.bulk_create(User(username=f'voter{n}') for n in range(20))
+        Vote.objects.bulk_create(Vote(question=question, choice=choice, user=user) for user in users)
+        queued = len(connection.run_on_commit)
+        VoteArchive.archive(question, batch_size=7)
+        self.assertEqual(len(connection.run_on_commit), queued + 1)
+        self.assertEqual(VoteArchive.objects.get(question=question).count, 20)
+
+    def test_archived_votes_stay_visible(self):
+        """After archiving, the export and the voter's results page still show the archived votes."""
+        question = Question.objects.create(question_text='Archived question.',
+                                           end_date=timezone.now() - datetime.timedelta(days=100))
+        choice = question.choice_set.create(choice_text='Only')
+        user = User.objects.create_user(username='voter', password='password')
+        Vote.objects.cast(question, choice, user)
+        call_command('archive_votes', '--days', '30', stdout=StringIO())
+        out = StringIO()
+        call_command('export_votes', '--question', str(question.id), '--format', 'jsonl', stdout=out)
+        self.assertEqual([json.loads(line) for line in out.getvalue().splitlines()],
+                         [{'vote_id': None, 'question_id': question.id, 'question': 'Archived question.',
+                           'choice_id': choice.id, 'choice': 'Only', 'user_id': user.id, 'username': 'voter'}])
+        self.client.login(username='voter', password='password')
+        response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertEqual(response.context['user_choice']['id'], choice.id)
+
+class BackfillRollupsCommandTests(TestCase):
+    """Test the backfill_rollups management command."""
+
+    def test_backfill_matches_incremental_rollups(self):
+        """Rebuilt buckets equal the ones kept by the vote path, and untimed votes are skipped."""
+        question = Question.objects.create(question_text='Rollup question.')
+        choice = question.choice_set.create(choice_text='Only')
+        users = [User.objects.create_user(username=f'voter{n}', password='password') for n in range(3)]
+        for user in users[:2]:
+            Vote.objects.cast(question, choice, user)
+        Vote.objects.create(question=question, choice=choice, user=users[2], voted_at=None)
+        fields = ('choice_id', 'resolution', 'bucket', 'count')
+        incremental = sorted(VoteRollup.objects.values_list(*fields))
+        VoteRollup.objects.update(count=0)
+        out = StringIO()
+        call_command('backfill_rollups', stdout=out)
+        self.assertEqual(sorted(VoteRollup.objects.values_list(*fields)), incremental)
+        self.assertIn('Skipped 1 votes', out.getvalue())
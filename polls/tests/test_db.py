@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from polls.models import Question, Vote
+from polls.signals import apply_sqlite_pragmas
+
+
+class SQLitePragmaTests(TestCase):
+    """Test the SQLite connection hook of the production profile."""
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1234})
+    def test_pragmas_applied(self):
+        """The configured pragmas are run on the connection."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        apply_sqlite_pragmas(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -1234)
+
+
+class SQLiteTransactionModeTests(TransactionTestCase):
+    """Test how transactions begin on SQLite."""
+
+    def setUp(self):
+        """Create a question with a choice and a voter."""
+        self.question = Question.objects.create(question_text='Locked question.')
+        self.choice = self.question.choice_set.create(choice_text='Only')
+        self.user = User.objects.create_user(username='voter')
+
+    def test_vote_begins_immediate(self):
+        """A vote takes the write lock when its transaction begins rather than at its first write."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with CaptureQueriesContext(connection) as queries:
+            Vote.objects.cast(self.question, self.choice, self.user)
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    def test_other_transactions_begin_deferred(self):
+        """Transactions outside the vote path, e.g. read-only ones, do not take the write lock."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        Vote.objects.cast(self.question, self.choice, self.user)
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                Question.objects.exists()
+        self.assertEqual(queries[0]['sql'], 'BEGIN')
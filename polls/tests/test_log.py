@@ -0,0 +1,39 @@
+import logging
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from polls.log import QueueListenerHandler
+
+
+class QueueListenerHandlerTests(SimpleTestCase):
+    """Test the non-blocking file handler."""
+
+    def test_records_reach_file(self):
+        """Queued records are written to the file by the listener."""
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.log')
+            handler = QueueListenerHandler(filename)
+            handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+            logger = logging.getLogger('polls.tests.queue')
+            logger.addHandler(handler)
+            logger.propagate = False
+            try:
+                logger.warning('hello %s', 'queue')
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+            with open(filename, encoding='utf-8') as log_file:
+                self.assertEqual(log_file.read(), 'WARNING hello queue\n')
+
+    def test_full_queue_drops_records(self):
+        """Records are dropped instead of blocking when the queue is full."""
+        with tempfile.TemporaryDirectory() as directory:
+            handler = QueueListenerHandler(os.path.join(directory, 'test.log'), queue_size=1)
+            handler.stop()
+            record = logging.makeLogRecord({'msg': 'dropped'})
+            handler.handle(record)
+            handler.handle(record)
+            self.assertEqual(handler.dropped, 1)
+            handler.close()
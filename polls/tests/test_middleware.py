@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.middleware import request_stats
+
+
+class TimingMiddlewareTests(TestCase):
+    """Test the per-request SQL and timing instrumentation."""
+
+    def setUp(self):
+        """Start from empty statistics."""
+        request_stats.reset()
+
+    def test_server_timing_header(self):
+        """Responses carry the DB, view, render and total durations."""
+        response = self.client.get(reverse('polls:index'))
+        names = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(names, ['db', 'view', 'render', 'total'])
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_stats_per_url_name(self):
+        """Requests are aggregated per URL name and shown to staff only."""
+        self.client.get(reverse('polls:index'))
+        self.client.get(reverse('polls:index'))
+        url = reverse('polls:request_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.login(username='staff', password='password')
+        stats = self.client.get(url).json()
+        self.assertEqual(stats['polls:index']['count'], 2)
+        self.assertEqual(stats['polls:index']['avg']['queries'], 1)
+        self.assertGreater(stats['polls:index']['max']['render_ms'], 0)
+
+    @override_settings(POLLS_SLOW_QUERY_MS=1e-9)
+    def test_slow_query_log(self):
+        """Queries above the threshold are logged."""
+        with self.assertLogs('polls.slow_queries', level='WARNING') as logs:
+            self.client.get(reverse('polls:index'))
+        self.assertIn('polls_question', logs.output[0])
@@ -1,9 +1,11 @@
 import datetime
 
+from django.contrib.auth.models import User
+from django.db import IntegrityError
 from django.test import TestCase
 from django.utils import timezone
 
-from polls.models import Question
+from polls.models import Question, Choice, Vote, VoteRollup
 
 
 class QuestionModelTests(TestCase):
@@ -84,4 +86,108 @@ class QuestionModelTests(TestCase):
         pub_date = timezone.now() + datetime.timedelta(days=1)
         end_date = timezone.now()
         before = Question(pub_date=pub_date, end_date=end_date)
-        self.assertIs(before.can_vote(), False)
\ No newline at end of file
+        self.assertIs(before.can_vote(), False)
+
+class ChoiceRecountTests(TestCase):
+    """Test rebuilding the denormalized vote counters."""
+
+    def test_recount_matches_vote_table(self):
+        """recount() sets vote_count and vote_total from the Vote rows."""
+        question = Question.objects.create(question_text="Recount question.")
+        first = question.choice_set.create(choice_text="First", vote_count=7)
+        second = question.choice_set.create(choice_text="Second")
+        for name in ('a', 'b', 'c'):
+            user = User.objects.create_user(username=name, password='password')
+            Vote.objects.create(question=question, choice=first if name != 'c' else second, user=user)
+        Choice.objects.filter(question=question).recount()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        question.refresh_from_db()
+        self.assertEqual(first.votes(), 2)
+        self.assertEqual(second.votes(), 1)
+        self.assertEqual(question.vote_total, 3)
+
+
+class VoteCastTests(TestCase):
+    """Test the one-vote-per-user upsert."""
+
+    def setUp(self):
+        """Create a question with two choices and a user."""
+        self.question = Question.objects.create(question_text="Cast question.")
+        self.first = self.question.choice_set.create(choice_text="First")
+        self.second = self.question.choice_set.create(choice_text="Second")
+        self.user = User.objects.create_user(username='voter', password='password')
+
+    def test_cast_returns_previous_choice(self):
+        """cast() returns None for a first vote and the old choice id for a change."""
+        self.assertIsNone(Vote.objects.cast(self.question, self.first, self.user))
+        self.assertEqual(Vote.objects.cast(self.question, self.second, self.user), self.first.id)
+        self.assertEqual(Vote.objects.get(question=self.question, user=self.user).choice, self.second)
+
+    def test_duplicate_vote_rejected(self):
+        """The database refuses a second vote row for the same user and question."""
+        Vote.objects.create(question=self.question, choice=self.first, user=self.user)
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(question=self.question, choice=self.second, user=self.user)
+
+
+class VoteRollupTests(TestCase):
+    """Test the incremental minute and hour vote buckets."""
+
+    def setUp(self):
+        """Create a question with two choices and two users."""
+        self.question = Question.objects.create(question_text="Rollup question.")
+        self.first = self.question.choice_set.create(choice_text="First")
+        self.second = self.question.choice_set.create(choice_text="Second")
+        self.users = [User.objects.create_user(username=f'voter{n}', password='password') for n in range(2)]
+
+    def counts(self, resolution):
+        """Return {choice_id: votes} summed over the buckets of `resolution`."""
+        counts = {}
+        for choice_id, count in VoteRollup.objects.filter(resolution=resolution).values_list('choice_id', 'count'):
+            counts[choice_id] = counts.get(choice_id, 0) + count
+        return counts
+
+    def test_cast_updates_buckets(self):
+        """New votes are added to their buckets and a changed vote moves between choices."""
+        Vote.objects.cast(self.question, self.first, self.users[0])
+        Vote.objects.cast(self.question, self.first, self.users[1])
+        Vote.objects.cast(self.question, self.second, self.users[1])
+        for resolution in VoteRollup.RESOLUTIONS:
+            self.assertEqual(self.counts(resolution), {self.first.id: 1, self.second.id: 1})
+        vote = Vote.objects.get(user=self.users[0])
+        bucket = VoteRollup.objects.get(choice=self.first, resolution=VoteRollup.MINUTE).bucket
+        self.assertEqual(bucket, VoteRollup.truncate(vote.voted_at, VoteRollup.MINUTE))
+
+    def test_cast_many_updates_buckets(self):
+        """Batched votes update the buckets once per choice."""
+        Vote.objects.cast(self.question, self.first, self.users[0])
+        Vote.objects.cast_many({(self.question.id, self.users[0].id): self.second.id,
+                                (self.question.id, self.users[1].id): self.second.id})
+        self.assertEqual(self.counts(VoteRollup.HOUR), {self.first.id: 0, self.second.id: 2})
+
+    def test_add_upserts_in_one_statement(self):
+        """Deltas for new and existing buckets are written by a single statement."""
+        moment = datetime.datetime(2020, 10, 27, 20, 42, 13, tzinfo=datetime.timezone.utc)
+        VoteRollup.objects.add({(self.question.id, self.first.id, moment): 2})
+        with self.assertNumQueries(1):
+            VoteRollup.objects.add({(self.question.id, self.first.id, moment): -1,
+                                    (self.question.id, self.second.id, moment + datetime.timedelta(minutes=1)): 1,
+                                    (self.question.id, self.second.id, None): 1})
+        self.assertEqual(self.counts(VoteRollup.MINUTE), {self.first.id: 1, self.second.id: 1})
+        self.assertEqual(self.counts(VoteRollup.HOUR), {self.first.id: 1, self.second.id: 1})
+        self.assertEqual(VoteRollup.objects.count(), 4)
+
+    def test_untimed_previous_vote(self):
+        """A vote from before voting times were kept was never rolled up, so changing it takes nothing back."""
+        Vote.objects.create(question=self.question, choice=self.first, user=self.users[0], voted_at=None)
+        Vote.objects.cast(self.question, self.second, self.users[0])
+        for resolution in VoteRollup.RESOLUTIONS:
+            self.assertEqual(self.counts(resolution), {self.second.id: 1})
+
+    def test_truncate(self):
+        """Buckets start on the minute or the hour, in UTC."""
+        moment = datetime.datetime(2020, 10, 27, 20, 42, 13, 5, tzinfo=datetime.timezone.utc)
+        self.assertEqual(VoteRollup.truncate(moment, VoteRollup.MINUTE), moment.replace(second=0, microsecond=0))
+        self.assertEqual(VoteRollup.truncate(moment, VoteRollup.HOUR),
+                         moment.replace(minute=0, second=0, microsecond=0))
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from polls.models import Question
+from polls.ratelimit import TokenBucketLimiter, get_client_ip, ip_limiter, session_limiter
+
+
+class TokenBucketLimiterTests(SimpleTestCase):
+    """Test the token buckets and their LRU eviction."""
+
+    def test_burst_then_refill(self):
+        """A bucket allows its burst, rejects, then refills over time."""
+        limiter = TokenBucketLimiter(rate=2, burst=3, max_keys=10)
+        self.assertEqual([limiter.allow('a', now=0) for _ in range(4)], [True, True, True, False])
+        self.assertTrue(limiter.allow('a', now=0.5))
+        self.assertFalse(limiter.allow('a', now=0.5))
+        self.assertEqual(limiter.stats(), {'allowed': 4, 'rejected': 2, 'evicted': 0, 'tracked_keys': 1})
+
+    def test_least_recently_used_key_evicted(self):
+        """The map never holds more than max_keys buckets."""
+        limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=2)
+        limiter.allow('a', now=0)
+        limiter.allow('b', now=0)
+        limiter.allow('a', now=0)
+        limiter.allow('c', now=0)
+        self.assertEqual(list(limiter._buckets), ['a', 'c'])
+        self.assertEqual(limiter.evicted, 1)
+
+
+class ClientIPTests(SimpleTestCase):
+    """Test which address identifies the client."""
+
+    def ip(self, remote_addr, x_forwarded_for):
+        """Return the client IP of a request from `remote_addr` carrying `x_forwarded_for`."""
+        return get_client_ip(RequestFactory().get('/', REMOTE_ADDR=remote_addr,
+                                                  HTTP_X_FORWARDED_FOR=x_forwarded_for))
+
+    def test_forwarded_for_ignored_without_trusted_proxy(self):
+        """A client cannot pick its own address by sending X-Forwarded-For."""
+        self.assertEqual(self.ip('198.51.100.1', '203.0.113.7'), '198.51.100.1')
+
+    @override_settings(POLLS_TRUSTED_PROXIES=['10.0.0.0/8'])
+    def test_rightmost_untrusted_hop_behind_proxies(self):
+        """Behind trusted proxies the client is the last hop they did not add themselves."""
+        self.assertEqual(self.ip('10.0.0.2', '203.0.113.7'), '203.0.113.7')
+        self.assertEqual(self.ip('10.0.0.2', '192.0.2.99, 203.0.113.7, 10.0.0.1'), '203.0.113.7')
+        self.assertEqual(self.ip('198.51.100.1', '203.0.113.7'), '198.51.100.1')
+
+
+class RateLimitedViewTests(TestCase):
+    """Test admission control in front of the vote view."""
+
+    def setUp(self):
+        """Create a question and a voter."""
+        self.question = Question.objects.create(question_text='Limited question.')
+        User.objects.create_user(username='voter', password='password')
+        self.url = reverse('polls:vote', args=(self.question.id,))
+
+    def test_excess_votes_rejected_before_database(self):
+        """Once the session's burst is spent the vote view answers 429 without any query."""
+        self.client.login(username='voter', password='password')
+        rejected = session_limiter.rejected
+        for _ in range(session_limiter.burst):
+            self.client.post(self.url, {}, REMOTE_ADDR='198.51.100.1')
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, {}, REMOTE_ADDR='198.51.100.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(session_limiter.rejected, rejected + 1)
+
+    @override_settings(POLLS_RATE_LIMIT={'ENABLED': True, 'RATE': 1.0, 'BURST': 10, 'IP_RATE': 0.001,
+                                         'IP_BURST': 2, 'MAX_KEYS': 100})
+    def test_ip_bucket_applies_across_sessions(self):
+        """Dropping the session cookie or spoofing X-Forwarded-For does not refill the IP bucket."""
+        statuses = []
+        for number in range(3):
+            self.client.cookies.clear()
+            statuses.append(self.client.post(self.url, {}, REMOTE_ADDR='198.51.100.2',
+                                             HTTP_X_FORWARDED_FOR=f'203.0.113.{number}').status_code)
+        self.assertEqual(statuses[-1], 429)
+        self.assertNotIn(429, statuses[:-1])
+        self.assertEqual(ip_limiter.burst, 2)
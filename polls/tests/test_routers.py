@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from polls.management.commands.sync_replicas import Command as SyncReplicasCommand
+from polls.models import Question
+from polls.routers import PIN_COOKIE, ReplicaMiddleware, ReplicaPool, ReplicaRouter, primary
+
+
+class ReplicaPoolTests(SimpleTestCase):
+    """Test the round-robin and health fallback of the replica pool."""
+
+    def test_round_robin_skips_unhealthy(self):
+        """Healthy replicas take turns and a down one is skipped."""
+        pool = ReplicaPool(['replica1', 'replica2', 'replica3'])
+        down = {'replica2'}
+        with mock.patch.object(pool, 'healthy', side_effect=lambda alias: alias not in down):
+            self.assertEqual([pool.choose() for _ in range(4)], ['replica1', 'replica3', 'replica1', 'replica3'])
+            down.update(pool.aliases)
+            self.assertIsNone(pool.choose())
+
+    def test_no_replicas(self):
+        """Without replicas the primary is used."""
+        self.assertIsNone(ReplicaPool([]).choose())
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    """Test which database the router picks during a request."""
+
+    def setUp(self):
+        """Pretend there is one healthy replica."""
+        pool = ReplicaPool(['replica'])
+        for patcher in (mock.patch('polls.routers.replica_pool', pool),
+                        mock.patch.object(pool, 'healthy', return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def route(self, request):
+        """Return the read alias used inside the request and the response."""
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Question))
+            with primary():
+                seen.append(self.router.db_for_read(Question))
+            return HttpResponse()
+        response = ReplicaMiddleware(view)(request)
+        return seen, response
+
+    def test_outside_requests_use_primary(self):
+        """Commands and signals read from the primary."""
+        self.assertEqual(self.router.db_for_read(Question), 'default')
+        self.assertEqual(self.router.db_for_write(Question), 'default')
+
+    def test_safe_request_reads_replica(self):
+        """A GET reads from the replica unless primary() is used."""
+        seen, response = self.route(self.factory.get('/polls/'))
+        self.assertEqual(seen, ['replica', 'default'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_client_to_primary(self):
+        """A POST uses the primary and pins the following reads of the client to it."""
+        seen, response = self.route(self.factory.post('/polls/1/vote/'))
+        self.assertEqual(seen, ['default', 'default'])
+        cookie = response.cookies[PIN_COOKIE].value
+        self.assertGreater(float(cookie), time.time())
+        request = self.factory.get('/polls/1/results/')
+        request.COOKIES[PIN_COOKIE] = cookie
+        self.assertEqual(self.route(request)[0], ['default', 'default'])
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.route(request)[0], ['replica', 'default'])
+
+
+class SyncReplicasCommandTests(SimpleTestCase):
+    """Test the SQLite replica stand-in copy."""
+
+    def test_copy(self):
+        """The replica file receives the rows of the primary."""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'primary.sqlite3')
+            target = os.path.join(directory, 'replica.sqlite3')
+            with sqlite3.connect(source) as db:
+                db.execute('CREATE TABLE poll (id INTEGER PRIMARY KEY)')
+                db.execute('INSERT INTO poll VALUES (7)')
+            db.close()
+            SyncReplicasCommand().copy(source, target)
+            db = sqlite3.connect(target)
+            self.assertEqual(db.execute('SELECT id FROM poll').fetchall(), [(7,)])
+            db.close()
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+from django.test import SimpleTestCase, override_settings
+
+from polls.pubsub import TallyBroker
+from polls.sse import events_question, results_events
+
+
+class FakeTallies:
+    """Loader returning in-memory tallies and counting its calls."""
+
+    def __init__(self, counts):
+        """Keep the tallies of question 1."""
+        self.counts = counts
+        self.calls = 0
+
+    async def __call__(self, question_id):
+        """Return the tally of question 1, or None for any other question."""
+        self.calls += 1
+        return dict(self.counts) if question_id == 1 else None
+
+
+class TallyBrokerTests(SimpleTestCase):
+    """Test coalescing of live tally updates."""
+
+    def test_votes_are_coalesced(self):
+        """Many notifications within the rate limit cost one load and send one delta."""
+        async def scenario():
+            tallies = FakeTallies({10: 0, 11: 0})
+            broker = TallyBroker(max_rate=5, loader=tallies)
+            subscription = await broker.subscribe(1)
+            self.assertEqual(await subscription.next(), {10: 0, 11: 0})
+            for votes in range(1, 51):
+                tallies.counts[10] = votes
+                broker.notify(1)
+            delta = await asyncio.wait_for(subscription.next(), 1)
+            self.assertEqual(delta, {10: 50})
+            self.assertEqual(tallies.calls, 2)
+            self.assertEqual(broker.subscriber_count(), 1)
+            broker.unsubscribe(1, subscription)
+            self.assertEqual(broker.subscriber_count(), 0)
+
+        asyncio.run(scenario())
+
+    def test_failed_refresh_closes_subscriptions(self):
+        """When the tally cannot be loaded the error is logged and the viewers' streams end."""
+        async def scenario():
+            tallies = FakeTallies({10: 0})
+            broker = TallyBroker(max_rate=50, loader=tallies)
+            subscription = await broker.subscribe(1)
+            self.assertEqual(await subscription.next(), {10: 0})
+            tallies.counts = None
+            broker.notify(1)
+            with self.assertLogs('polls.pubsub', 'ERROR'):
+                self.assertIsNone(await asyncio.wait_for(subscription.next(), 1))
+            self.assertEqual(broker.subscriber_count(), 0)
+            broker.unsubscribe(1, subscription)
+
+        asyncio.run(scenario())
+
+
+class ResultsEventsTests(SimpleTestCase):
+    """Test the ASGI Server-Sent Events endpoint."""
+
+    @override_settings(POLLS_SSE_HEARTBEAT=5)
+    def test_stream_until_disconnect(self):
+        """The stream sends the full tally, then a delta, and stops when the client leaves."""
+        async def scenario():
+            tallies = FakeTallies({10: 1, 11: 2})
+            broker = TallyBroker(max_rate=50, loader=tallies)
+            sent = []
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if len(sent) == 2:
+                    tallies.counts[11] = 3
+                    broker.notify(1)
+                elif len(sent) == 3:
+                    disconnect.set()
+
+            await asyncio.wait_for(results_events({'type': 'http'}, receive, send, 1, broker=broker), 5)
+            self.assertEqual(sent[0]['status'], 200)
+            events = [json.loads(message['body'].decode()[len('data: '):]) for message in sent[1:]]
+            self.assertEqual(events, [{'10': 1, '11': 2}, {'11': 3}])
+            self.assertEqual(broker.subscriber_count(), 0)
+
+        asyncio.run(scenario())
+
+    def test_events_path_resolved_under_root_path(self):
+        """The stream is found through the URLconf, also when the site is mounted below a root path."""
+        self.assertEqual(events_question({'path': '/polls/3/events/'}), 3)
+        self.assertEqual(events_question({'path': '/site/polls/3/events/', 'root_path': '/site'}), 3)
+        self.assertIsNone(events_question({'path': '/polls/3/'}))
+        self.assertIsNone(events_question({'path': '/nowhere/'}))
+
+    def test_unknown_question(self):
+        """Unknown questions get a 404."""
+        async def scenario():
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            await results_events({'type': 'http'}, None, send, 2, broker=TallyBroker(loader=FakeTallies({})))
+            self.assertEqual(sent[0]['status'], 404)
+
+        asyncio.run(scenario())
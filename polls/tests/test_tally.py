@@ -0,0 +1,125 @@
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from polls.cache import results_cache
+from polls.management.commands.benchmark_tally import python_runoff
+from polls.models import Ballot, Choice, Question
+from polls.pubsub import fetch_counts
+from polls.tally import ballot_matrix, instant_runoff, pack_ranking, unpack_ranking
+
+
+class TallyEngineTests(SimpleTestCase):
+    """Test the NumPy instant runoff engine."""
+
+    def test_ballot_matrix(self):
+        """Rankings become padded column matrices and unknown choices are dropped."""
+        rankings = [pack_ranking(ids) for ids in ([10, 20, 30], [20], [99, 10], [])]
+        self.assertEqual(unpack_ranking(rankings[0]), [10, 20, 30])
+        matrix = ballot_matrix(rankings, [10, 20, 30])
+        self.assertEqual(matrix.tolist(), [[0, 1, 2], [1, -1, -1], [-1, 0, -1], [-1, -1, -1]])
+
+    def test_runoff_transfers_eliminated_votes(self):
+        """The weakest choice is eliminated and its ballots count for their next choice."""
+        rankings = [pack_ranking(ids) for ids in ([1, 2], [1], [2, 1], [3, 2], [3, 2], [2, 3], [3])]
+        runoff = instant_runoff(ballot_matrix(rankings, [1, 2, 3]), np.ones(7), 3)
+        self.assertEqual(runoff['winner'], 2)
+        self.assertEqual([result['eliminated'] for result in runoff['rounds']], [0, 1, None])
+        self.assertEqual(runoff['rounds'][0]['counts'], {0: 2.0, 1: 2.0, 2: 3.0})
+        self.assertEqual(runoff['rounds'][1], {'counts': {1: 3.0, 2: 3.0}, 'exhausted': 1.0, 'eliminated': 1})
+        self.assertEqual(runoff['rounds'][2], {'counts': {2: 4.0}, 'exhausted': 3.0, 'eliminated': None})
+
+    def test_matches_python_reference(self):
+        """Random weighted ballots give the same rounds as the per-ballot Python tally."""
+        rng = np.random.default_rng(1)
+        rankings = [pack_ranking(rng.permutation(6)[:rng.integers(1, 7)] + 1) for _ in range(500)]
+        weights = rng.uniform(0.5, 2, size=500)
+        matrix = ballot_matrix(rankings, list(range(1, 7)))
+        expected = python_runoff([[c for c in row if c >= 0] for row in matrix.tolist()], weights.tolist(), 6)
+        runoff = instant_runoff(matrix, weights, 6)
+        self.assertEqual(runoff['winner'], expected['winner'])
+        self.assertEqual([r['eliminated'] for r in runoff['rounds']], [r['eliminated'] for r in expected['rounds']])
+        for result, reference in zip(runoff['rounds'], expected['rounds']):
+            self.assertEqual(list(result['counts']), sorted(reference['counts']))
+            for column, votes in result['counts'].items():
+                self.assertAlmostEqual(votes, reference['counts'][column])
+
+    def test_no_ballots(self):
+        """Without ballots there is no winner."""
+        runoff = instant_runoff(ballot_matrix([], [1, 2]), np.ones(0), 2)
+        self.assertIsNone(runoff['winner'])
+
+
+class RankedVoteTests(TestCase):
+    """Test ranked voting through the views."""
+
+    def setUp(self):
+        """Create a ranked question and log in."""
+        cache.clear()
+        self.question = Question.objects.create(question_text='Ranked question.', kind=Question.RANKED)
+        self.choices = [self.question.choice_set.create(choice_text=text) for text in ('Red', 'Green', 'Blue')]
+        self.user = User.objects.create_user(username='ranker', password='password')
+        self.client.force_login(self.user)
+
+    def test_rank_and_view_runoff(self):
+        """A posted ranking is stored and the results page shows the runoff."""
+        red, green, blue = self.choices
+        url = reverse('polls:vote', args=(self.question.id,))
+        response = self.client.post(url, {f'rank_{blue.id}': '1', f'rank_{red.id}': '2'})
+        self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)))
+        self.assertEqual(Ballot.objects.get().choice_ids(), [blue.id, red.id])
+        self.client.post(url, {f'rank_{green.id}': '1'})
+        self.assertEqual(Ballot.objects.get().choice_ids(), [green.id])
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.vote_total, 1)
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'Instant runoff: Green wins')
+        self.assertEqual(response.context['user_ranking'], ['Green'])
+
+    def test_deleted_choice(self):
+        """Deleting a ranked choice recounts the runoff, and a runoff cached before the delete is still shown."""
+        red, green, blue = self.choices
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {f'rank_{blue.id}': '1', f'rank_{red.id}': '2'})
+        url = reverse('polls:results', args=(self.question.id,))
+        self.assertContains(self.client.get(url), 'Instant runoff: Blue wins')
+        blue.delete()
+        self.assertContains(self.client.get(url), 'Instant runoff: Red wins')
+        # a removal the signals never saw leaves the cached runoff behind.
+        self.question.choice_set.filter(pk=red.id)._raw_delete(Choice.objects.db)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user_ranking'], [])
+
+    def test_invalid_ranking(self):
+        """Duplicate ranks are rejected."""
+        red, green, _ = self.choices
+        response = self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                                    {f'rank_{red.id}': '1', f'rank_{green.id}': '1'})
+        self.assertContains(response, 'different number')
+        self.assertFalse(Ballot.objects.exists())
+
+    def test_runoff_cached_per_tally_version(self):
+        """The runoff is computed once per tally version."""
+        red = self.choices[0]
+        Ballot.objects.cast(self.question, [red.id], self.user)
+        self.question.refresh_from_db()
+        results_cache.runoff(self.question)
+        with self.assertNumQueries(0):
+            self.assertEqual(results_cache.runoff(self.question)['winner'], red.id)
+        Ballot.objects.cast(self.question, [self.choices[1].id], self.user)
+        self.question.refresh_from_db()
+        self.assertEqual(results_cache.runoff(self.question)['winner'], self.choices[1].id)
+
+    def test_api_and_live_counts_use_the_runoff(self):
+        """The JSON results and the live tally of a ranked question count ballots, not the unused vote counters."""
+        red, green, blue = self.choices
+        Ballot.objects.cast(self.question, [blue.id, red.id], self.user)
+        Ballot.objects.cast(self.question, [red.id], User.objects.create_user(username='second'))
+        Ballot.objects.cast(self.question, [green.id, blue.id], User.objects.create_user(username='third'))
+        data = self.client.get(reverse('polls:api_results', args=(self.question.id,))).json()
+        self.assertEqual((data['winner'], data['ballots'], data['total']), (blue.id, 3, 2))
+        self.assertEqual([choice['vote_count'] for choice in data['choices']], [0, 0, 2])
+        self.assertEqual(fetch_counts(self.question.id), {red.id: 0, green.id: 0, blue.id: 2})
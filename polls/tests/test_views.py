@@ -1,11 +1,17 @@
 import datetime
+import json
+from io import StringIO
 
+from django.contrib.auth.models import User
 from django.http import HttpResponseRedirect
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
-from polls.models import Question
+from polls.cache import results_cache
+from polls.models import Question, ResultSnapshot, Vote, VoteArchive
 
 
 def create_question(question_text, days):
@@ -69,6 +75,46 @@ class QuestionIndexViewTest(TestCase):
             ['<Question: Past question 2.>', '<Question: Past question 1.>']
         )
 
+    @override_settings(POLLS_INDEX_PAGE_SIZE=2)
+    def test_keyset_pagination(self):
+        """The index is split into pages that follow each other through the cursor."""
+        for days in range(-5, 0):
+            create_question(question_text=f"Past question {days}.", days=days)
+        seen = []
+        url = reverse('polls:index')
+        while url:
+            response = self.client.get(url)
+            seen += [question.question_text for question in response.context['latest_question_list']]
+            cursor = response.context['next_cursor']
+            url = f"{reverse('polls:index')}?after={cursor}" if cursor else None
+        self.assertEqual(seen, [f"Past question {days}." for days in range(-1, -6, -1)])
+
+    def test_out_of_range_cursor(self):
+        """A cursor too large for a date or an id is ignored like any other malformed one."""
+        create_question(question_text="Past question.", days=-1)
+        for cursor in ('100000000000000000000_1', '1_100000000000000000000'):
+            response = self.client.get(reverse('polls:index'), {'after': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['latest_question_list']), 1)
+            response = self.client.get(reverse('polls:api_questions'), {'after': cursor})
+            self.assertEqual(response.status_code, 200)
+
+    def test_status_filter(self):
+        """The status parameter selects open, closed or upcoming polls."""
+        now = timezone.now()
+        Question.objects.create(question_text="Open.", pub_date=now - datetime.timedelta(days=1),
+                                end_date=now + datetime.timedelta(days=1))
+        Question.objects.create(question_text="Closed.", pub_date=now - datetime.timedelta(days=2),
+                                end_date=now - datetime.timedelta(days=1))
+        Question.objects.create(question_text="Upcoming.", pub_date=now + datetime.timedelta(days=1),
+                                end_date=now + datetime.timedelta(days=2))
+        for status, expected in (('open', 'Open.'), ('closed', 'Closed.'), ('upcoming', 'Upcoming.')):
+            response = self.client.get(reverse('polls:index'), {'status': status})
+            self.assertEqual([str(q) for q in response.context['latest_question_list']], [expected])
+        response = self.client.get(reverse('polls:index'))
+        self.assertEqual([q.is_open for q in response.context['latest_question_list']], [True, False])
+
+
 class QuestionDetailViewTests(TestCase):
     """Test question detail page."""
 
@@ -84,4 +130,252 @@ class QuestionDetailViewTests(TestCase):
         past_question = create_question(question_text='Past Question.', days=-5)
         url = reverse('polls:detail', args=(past_question.id,))
         response = self.client.get(url)
-        self.assertContains(response, past_question.question_text)
\ No newline at end of file
+        self.assertContains(response, past_question.question_text)
+
+class VoteViewTests(TestCase):
+    """Test voting and the vote counters it maintains."""
+
+    def setUp(self):
+        """Create a question with two choices and log a user in."""
+        cache.clear()
+        self.question = create_question(question_text='Vote question.', days=-1)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        User.objects.create_user(username='voter', password='password')
+        self.client.login(username='voter', password='password')
+
+    def vote(self, choice):
+        """Post a vote for `choice`."""
+        return self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': choice.id})
+
+    def assertCounts(self, first, second):
+        """Check the counters of both choices and the question total."""
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.question.refresh_from_db()
+        self.assertEqual((self.first.vote_count, self.second.vote_count), (first, second))
+        self.assertEqual(self.question.vote_total, first + second)
+
+    def test_vote_increments_counter(self):
+        """A first vote increments the chosen choice and the question total."""
+        response = self.vote(self.first)
+        self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)))
+        self.assertCounts(1, 0)
+
+    def test_change_vote_moves_counter(self):
+        """Changing a vote moves one count between choices without changing the total."""
+        self.vote(self.first)
+        self.vote(self.second)
+        self.assertCounts(0, 1)
+        self.assertEqual(Vote.objects.filter(question=self.question).count(), 1)
+
+    @override_settings(POLLS_TRUSTED_PROXIES=['127.0.0.1', '10.0.0.0/8'])
+    def test_vote_writes_audit_event(self):
+        """A vote is recorded in the audit log with the user, choice and client IP."""
+        with self.assertLogs('polls.audit', level='INFO') as logs:
+            self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.first.id},
+                             HTTP_X_FORWARDED_FOR='203.0.113.7, 10.0.0.1')
+        event = json.loads(logs.records[0].getMessage())
+        self.assertEqual(event, {'event': 'vote', 'user': 'voter', 'question': self.question.id,
+                                 'choice': self.first.id, 'previous_choice': None, 'ip': '203.0.113.7'})
+
+    def test_same_vote_twice(self):
+        """Voting for the same choice again does not change the counters."""
+        self.vote(self.first)
+        self.vote(self.first)
+        self.assertCounts(1, 0)
+
+
+class ResultsViewTests(TestCase):
+    """Test the results page."""
+
+    def setUp(self):
+        """Create a question with a few voted choices."""
+        cache.clear()
+        self.question = create_question(question_text='Results question.', days=-1)
+        self.choices = [self.question.choice_set.create(choice_text=f'Choice {n}', vote_count=n) for n in range(1, 4)]
+        self.user = User.objects.create_user(username='voter', password='password')
+        Vote.objects.create(question=self.question, choice=self.choices[1], user=self.user)
+
+    def test_results_rows(self):
+        """results() returns counts, percentages and the user's choice."""
+        results = self.question.results(self.user)
+        self.assertEqual([row['votes'] for row in results], [1, 2, 3])
+        self.assertEqual([row['percentage'] for row in results], [16.7, 33.3, 50.0])
+        self.assertEqual([row['selected'] for row in results], [False, True, False])
+
+    def test_results_query_count_is_constant(self):
+        """The results page does not issue a query per choice."""
+        self.client.login(username='voter', password='password')
+        url = reverse('polls:results', args=(self.question.id,))
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        for n in range(10):
+            self.question.choice_set.create(choice_text=f'Extra {n}')
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertContains(response, 'voter has voted Choice 2')
+
+
+class ResultsCacheTests(TransactionTestCase):
+    """Test the results cache and its invalidation on vote."""
+
+    def setUp(self):
+        """Create a question with two choices and log a user in."""
+        cache.clear()
+        results_cache.reset_stats()
+        self.question = create_question(question_text='Cached question.', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Cached choice')
+        User.objects.create_user(username='voter', password='password')
+        self.client.login(username='voter', password='password')
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_hit_after_miss(self):
+        """The second results request is served from the cache."""
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertContains(response, '-- 0 (0.0%)')
+        self.assertEqual(results_cache.stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_vote_invalidates_cache(self):
+        """A vote drops the cached tally so the new count is shown."""
+        self.client.get(self.url)
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        response = self.client.get(self.url)
+        self.assertContains(response, '-- 1 (100.0%)')
+        self.assertContains(response, 'voter has voted Cached choice')
+        self.assertEqual(results_cache.stats()['misses'], 2)
+
+    def test_late_writer_cannot_restore_old_tally(self):
+        """A tally read before a vote and stored after it is not served afterwards."""
+        before = Question.objects.get(pk=self.question.pk)
+        stale = before.results()
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        results_cache.cache.set(results_cache.key(before), stale)
+        self.assertContains(self.client.get(self.url), '-- 1 (100.0%)')
+
+
+class ExportViewTests(TestCase):
+    """Test the streaming vote export."""
+
+    def setUp(self):
+        """Create a voted question and log a staff user in."""
+        self.question = create_question(question_text='Export question.', days=-1)
+        choice = self.question.choice_set.create(choice_text='Exported, with comma')
+        staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        Vote.objects.create(question=self.question, choice=choice, user=staff)
+        self.client.login(username='staff', password='password')
+
+    def test_csv_export(self):
+        """The CSV export streams a header and one row per vote."""
+        response = self.client.get(reverse('polls:export_question', args=(self.question.id, 'csv')))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'vote_id,question_id,question,choice_id,choice,user_id,username')
+        self.assertIn('"Exported, with comma"', lines[1])
+        self.assertEqual(len(lines), 2)
+
+    def test_jsonl_export_by_date_range(self):
+        """The JSONL export filters questions by publication date."""
+        url = reverse('polls:export', args=('jsonl',))
+        response = self.client.get(url, {'since': '2000-01-01'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['staff'])
+        response = self.client.get(url, {'until': '2000-01-01'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+
+    def test_export_requires_staff(self):
+        """Non-staff users are sent to the admin login page."""
+        self.client.logout()
+        response = self.client.get(reverse('polls:export', args=('csv',)))
+        self.assertEqual(response.status_code, 302)
+
+
+class IndexFragmentCacheTests(TestCase):
+    """Test the cached poll cards of the index page."""
+
+    def setUp(self):
+        """Start from an empty cache with one question."""
+        cache.clear()
+        self.question = create_question(question_text='Cached card.', days=-1)
+
+    def test_card_is_cached_until_question_saved(self):
+        """Cards are served from the cache until the question is saved."""
+        self.client.get(reverse('polls:index'))
+        Question.objects.filter(pk=self.question.id).update(question_text='Changed behind the cache.')
+        self.assertContains(self.client.get(reverse('polls:index')), 'Cached card.')
+        self.question.question_text = 'Saved card.'
+        self.question.save()
+        self.assertContains(self.client.get(reverse('polls:index')), 'Saved card.')
+
+    def test_choice_change_refreshes_card(self):
+        """Editing a choice marks its question as updated."""
+        before = self.question.updated_at
+        self.question.choice_set.create(choice_text='New choice')
+        self.question.refresh_from_db()
+        self.assertGreater(self.question.updated_at, before)
+
+
+class ClosedPollTests(TestCase):
+    """Test frozen results and voting on closed polls."""
+
+    def setUp(self):
+        """Create a closed question with a vote and log the voter in."""
+        cache.clear()
+        now = timezone.now()
+        self.question = Question.objects.create(question_text='Closed question.',
+                                                pub_date=now - datetime.timedelta(days=2),
+                                                end_date=now - datetime.timedelta(days=1))
+        self.choice = self.question.choice_set.create(choice_text='Winner')
+        user = User.objects.create_user(username='voter', password='password')
+        Vote.objects.create(question=self.question, choice=self.choice, user=user)
+        self.client.login(username='voter', password='password')
+
+    def test_close_polls_freezes_results(self):
+        """close_polls stores the final tally and the results page serves it with private, revalidated caching."""
+        call_command('close_polls', stdout=StringIO())
+        self.assertEqual(self.question.snapshot.total, 1)
+        Vote.objects.all().delete()
+        url = reverse('polls:results', args=(self.question.id,))
+        response = self.client.get(url)
+        self.assertContains(response, 'Final results')
+        self.assertContains(response, '-- 1 (100.0%)')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=60')
+        self.assertEqual(response['Vary'], 'Cookie')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_reopening_drops_the_snapshot(self):
+        """Moving the end date of a frozen question drops its snapshot and puts its archived votes back."""
+        call_command('archive_votes', '--days', '0', stdout=StringIO())
+        self.assertFalse(Vote.objects.exists())
+        self.question.end_date = timezone.now() + datetime.timedelta(days=1)
+        self.question.save()
+        self.assertFalse(ResultSnapshot.objects.filter(question=self.question).exists())
+        self.assertFalse(VoteArchive.objects.filter(question=self.question).exists())
+        self.assertEqual(Vote.objects.filter(question=self.question).count(), 1)
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertNotContains(response, 'Final results')
+
+    def test_final_results_etag_is_per_user(self):
+        """Another user, or the same one after the question is edited, does not match the cached page."""
+        call_command('close_polls', stdout=StringIO())
+        url = reverse('polls:results', args=(self.question.id,))
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.login(username='voter', password='password')
+        self.question.question_text = 'Renamed closed question.'
+        self.question.save()
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), 'Renamed closed question.')
+
+    def test_vote_rejected_on_closed_poll(self):
+        """Votes on a closed poll are refused without changing the votes."""
+        other = User.objects.create_user(username='late', password='password')
+        self.client.login(username='late', password='password')
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        self.assertRedirects(response, reverse('polls:index'))
+        self.assertFalse(Vote.objects.filter(user=other).exists())
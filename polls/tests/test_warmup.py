@@ -0,0 +1,30 @@
+from django.test import TestCase, override_settings
+
+from polls.cache import results_cache
+from polls.middleware import request_stats
+from polls.models import Question
+from polls.warmup import compile_templates, warm_up
+
+
+class WarmUpTests(TestCase):
+    """Test the worker warm-up stages."""
+
+    def setUp(self):
+        """Start from an empty results cache."""
+        results_cache.cache.clear()
+        results_cache.reset_stats()
+
+    def test_compiles_project_and_admin_templates(self):
+        """The polls and admin templates are compiled."""
+        self.assertGreater(compile_templates(), 20)
+
+    @override_settings(POLLS_WARMUP_URLS=['/polls/'])
+    def test_warm_up(self):
+        """Every stage runs, open polls are cached and the warm-up requests are not recorded."""
+        question = Question.objects.create(question_text='Warm question.')
+        timings = warm_up()
+        self.assertEqual(list(timings), ['urlconf', 'templates', 'results_cache', 'requests', 'connections'])
+        self.assertEqual(request_stats.snapshot(), {})
+        results_cache.reset_stats()
+        results_cache.results(question)
+        self.assertEqual(results_cache.stats()['hits'], 1)
@@ -1,6 +1,6 @@
-from django.urls import path
+from django.urls import path, re_path
 
-from . import views
+from . import api, views
 
 app_name = 'polls'
 urlpatterns = [
@@ -10,4 +10,13 @@ urlpatterns = [
     path('<int:pk>/results/', views.show_vote, name='results'),
     path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
     path('<int:question_id>/vote/', views.vote, name='vote'),
+    path('<int:pk>/events/', views.results_events, name='events'),
+    re_path(r'^(?P<pk>[0-9]+)/export\.(?P<fmt>csv|jsonl)$', views.export_votes, name='export_question'),
+    re_path(r'^export\.(?P<fmt>csv|jsonl)$', views.export_votes, name='export'),
+    path('api/questions/', api.questions, name='api_questions'),
+    path('api/<int:pk>/results/', api.results, name='api_results'),
+    path('api/<int:pk>/timeseries/', api.timeseries, name='api_timeseries'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('request-stats/', views.request_timings, name='request_stats'),
+    path('rate-limit-stats/', views.rate_limit_stats, name='rate_limit_stats'),
 ]
@@ -1,15 +1,27 @@
-from django.http import HttpResponseRedirect
-from django.shortcuts import render, get_object_or_404, redirect
+import datetime
+
+from django.conf import settings
+from django.http import (HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from django.urls import reverse
 from django.views import generic
 from django.utils import timezone
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.db.models import F
-
-from .models import Question, Choice, Vote
 
-import logging
+from .buffer import BufferFull, vote_buffer
+from .cache import results_cache
+from .export import FORMATS, export_lines, parse_range, vote_rows
+from .log import audit
+from .middleware import request_stats
+from .ratelimit import get_client_ip, ip_limiter, rate_limited, session_limiter
+from .models import EPOCH, Question, Choice, Vote, Ballot
+from .tally import tidy
 
 
 class IndexView(generic.ListView):
@@ -19,10 +31,29 @@ class IndexView(generic.ListView):
     context_object_name = 'latest_question_list'
 
     def get_queryset(self):
-        """Return the last five published questions (not including those set to be published in the future)."""
-        return Question.objects.filter(
-            pub_date__lte=timezone.now()
-        ).order_by('-pub_date')
+        """Return one page of questions, newest first.
+
+        The ``status`` parameter picks open, closed or upcoming polls (published
+        ones by default) and ``after`` is the cursor of the previous page's last row.
+        """
+        page_size = settings.POLLS_INDEX_PAGE_SIZE
+        questions = Question.objects.with_status(self.request.GET.get('status'))
+        cursor = decode_cursor(self.request.GET.get('after'))
+        if cursor:
+            questions = questions.after(*cursor)
+        page = list(questions.order_by('-pub_date', '-id')[:page_size + 1])
+        self.next_cursor = encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+        return page[:page_size]
+
+    def get_context_data(self, **kwargs):
+        """Add the cursor of the next page and the status filter to the context."""
+        context = super().get_context_data(**kwargs)
+        status = self.request.GET.get('status')
+        context['next_cursor'] = self.next_cursor
+        context['status'] = status if status in Question.STATUSES else ''
+        context['statuses'] = Question.STATUSES
+        context['fragment_timeout'] = settings.POLLS_FRAGMENT_CACHE_TIMEOUT
+        return context
 
 
 class DetailView(generic.DetailView):
@@ -42,79 +73,202 @@ class ResultsView(generic.DetailView):
     model = Question
     template_name = 'polls/results.html'
 
+    def get_queryset(self):
+        """Fetch the snapshot of closed questions with the question."""
+        return Question.objects.select_related('snapshot')
+
+    def get_context_data(self, **kwargs):
+        """Add the question results and the user's choice to the context."""
+        context = super().get_context_data(**kwargs)
+        context.update(results_context(self.object, self.request.user))
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        """Let browsers revalidate final results instead of downloading them again."""
+        response = super().render_to_response(context, **response_kwargs)
+        if context['final']:
+            return cache_final_results(self.request, response, context)
+        return response
+
 
+@rate_limited
 @login_required
 def vote(request, question_id):
     """Vote function for polls app."""
     question = get_object_or_404(Question, pk=question_id)
-    # user can vote once per poll.
-    # if Vote.objects.filter(question_id=question_id, user_id=request.user.id).exists():
-    #     configure()
-    #     return render(request, 'polls/detail.html', {
-    #     'question': question,
-    #     'error_message': "You've already vote for this poll."
-    #     })
+    if not question.can_vote():
+        messages.error(request, f'You are not allowed to vote in the "{question.question_text}" poll!')
+        return redirect('polls:index')
+    if question.is_ranked():
+        return rank(request, question)
     try:
-        configure()
-        get_client_ip(request)
         selected_choice = question.choice_set.get(pk=request.POST['choice'])
     except (KeyError, Choice.DoesNotExist):
-        configure()
-        get_client_ip(request)
         # Redisplay the question voting form.
-        return render(request, 'polls/detail.html', {
+        return TemplateResponse(request, 'polls/detail.html', {
             'question': question,
             'error_message': "You didn't select a choice.",
         })
     else:
-        if Vote.objects.filter(question_id=question_id, user_id=request.user.id).exists():
-            configure()
-            get_client_ip(request)
-            user_vote = question.vote_set.get(user=request.user)
-            user_vote.choice = selected_choice
-            user_vote.save()
+        if settings.POLLS_VOTE_MODE == 'buffered':
+            try:
+                vote_buffer.submit(question.id, selected_choice.id, request.user.id)
+            except BufferFull:
+                return HttpResponse('Too many votes are waiting to be saved, please try again.', status=503)
+            audit('vote', user=request.user.username, question=question.id, choice=selected_choice.id,
+                  queued=True, ip=get_client_ip(request))
         else:
-            configure()
-            get_client_ip(request)
-            selected_choice.vote_set.create(user=request.user, question=question)
-
+            previous = Vote.objects.cast(question, selected_choice, request.user)
+            audit('vote', user=request.user.username, question=question.id, choice=selected_choice.id,
+                  previous_choice=previous, ip=get_client_ip(request))
         return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
 
+def rank(request, question):
+    """Record the ranking posted as ``rank_<choice id>`` numbers, 1 for the most preferred choice."""
+    ranks = []
+    for choice_id in question.choice_set.values_list('id', flat=True):
+        value = request.POST.get(f'rank_{choice_id}', '').strip()
+        if value:
+            try:
+                ranks.append((int(value), choice_id))
+            except ValueError:
+                ranks = None
+                break
+    if not ranks or len({number for number, _ in ranks}) != len(ranks) or min(ranks)[0] < 1:
+        return TemplateResponse(request, 'polls/detail.html', {
+            'question': question,
+            'error_message': 'Rank at least one choice, giving each ranked choice a different number.',
+        })
+    ranking = [choice_id for _, choice_id in sorted(ranks)]
+    Ballot.objects.cast(question, ranking, request.user)
+    audit('ballot', user=request.user.username, question=question.id, ranking=ranking, ip=get_client_ip(request))
+    return HttpResponseRedirect(reverse('polls:results', args=(question.id,)))
+
+@rate_limited
 def valid_vote(request, pk):
     """Check if the polls is valid to vote or not."""
     question = get_object_or_404(Question, pk=pk)
     if not question.can_vote():
         messages.error(request, f'You are not allowed to vote in the "{question.question_text}" poll!')
         return redirect('polls:index')
-    return render(request, 'polls/detail.html', {'question': question})
+    return TemplateResponse(request, 'polls/detail.html', {'question': question})
 
 def show_vote(request, pk):
-    question = get_object_or_404(Question, pk=pk)
-    user_vote = Vote.objects.filter(question_id=pk, user_id=request.user.id)
-    user_exist = Vote.objects.filter(question_id=pk, user_id=request.user.id).exists()
-    return render(request, 'polls/results.html', {'question': question, 'user_vote': user_vote, 'user_exist': user_exist})
-
-def configure():
-    """Configure loggers and log handlers"""
-    filehandler = logging.FileHandler("demo.log")
-    filehandler.setLevel(logging.NOTSET)
-    formatter = logging.Formatter('%(asctime)s %(name)s %(levelname)s: %(message)s')
-    filehandler.setFormatter(formatter)
-
-    root = logging.getLogger()
-    root.addHandler(filehandler)
-
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.WARNING)
-    formatter = logging.Formatter(fmt='%(levelname)-8s %(name)s: %(message)s')
-    console_handler.setFormatter(formatter)
-    root.addHandler(console_handler)
-
-def get_client_ip(request):
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
+    """Show the results of a poll and the choice of the current user."""
+    question = get_object_or_404(Question.objects.select_related('snapshot'), pk=pk)
+    context = {'question': question}
+    context.update(results_context(question, request.user))
+    response = TemplateResponse(request, 'polls/results.html', context)
+    if context['final']:
+        return cache_final_results(request, response, context)
+    return response
+
+def cache_final_results(request, response, context):
+    """Add validators to the unrendered results page of a closed poll and answer a matching request with a 304.
+
+    The page shows the user's own choice, so it is private, varies on the
+    session cookie and its ETag covers the user and the choice as well as the
+    snapshot and later edits of the question.
+    """
+    question = context['question']
+    last_modified = max(question.snapshot.created_at, question.updated_at).timestamp()
+    selected = context['user_choice']['id'] if context['user_choice'] else 0
+    etag = quote_etag(f'{question.pk}-{int(last_modified * 1e6)}-{request.user.pk or 0}-{selected}')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, max_age=settings.POLLS_SNAPSHOT_MAX_AGE)
+    patch_vary_headers(response, ['Cookie'])
+    return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+
+def results_context(question, user):
+    """Return the template context for the results of `question` as seen by `user`.
+
+    Closed questions with a snapshot are served from it (``final`` is True).
+    """
+    if question.is_ranked():
+        return runoff_context(question, user)
+    snapshot = getattr(question, 'snapshot', None) if question.is_closed() else None
+    if snapshot is not None:
+        results = snapshot.results(user)
     else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+        results = results_cache.results(question, user)
+    user_choice = next((row for row in results if row['selected']), None)
+    return {'results': results, 'user_choice': user_choice, 'final': snapshot is not None}
+
+def runoff_context(question, user):
+    """Return the template context for the instant runoff of a ranked question.
+
+    ``results`` holds the counts of the last round and ``runoff`` every round.
+    """
+    runoff = results_cache.runoff(question)
+    choices = dict(question.choice_set.order_by('id').values_list('id', 'choice_text'))
+    ranking = []
+    if user.is_authenticated:
+        ballot = Ballot.objects.filter(question=question, user_id=user.id).first()
+        ranking = ballot.choice_ids() if ballot else []
+    final_counts = runoff['rounds'][-1]['counts']
+    total = sum(final_counts.values())
+    results = [{'id': choice_id, 'choice_text': text, 'votes': tidy(final_counts.get(choice_id, 0)),
+                'percentage': round(100 * final_counts.get(choice_id, 0) / total, 1) if total else 0.0,
+                'selected': bool(ranking) and ranking[0] == choice_id}
+               for choice_id, text in choices.items()]
+    # a cached runoff may still count a choice deleted since; leave it out.
+    rounds = [{'counts': [(choices[choice_id], tidy(votes)) for choice_id, votes in result['counts'].items()
+                          if choice_id in choices],
+               'exhausted': tidy(result['exhausted']), 'eliminated': choices.get(result['eliminated'])}
+              for result in runoff['rounds']]
+    return {
+        'results': results,
+        'user_choice': next((row for row in results if row['selected']), None),
+        'user_ranking': [choices[choice_id] for choice_id in ranking if choice_id in choices],
+        'final': False,
+        'runoff': {'winner': choices.get(runoff['winner']), 'ballots': runoff['ballots'], 'rounds': rounds},
+    }
+
+def results_events(request, pk):
+    """Tell EventSource clients to stop; live results are only streamed by the ASGI application."""
+    return HttpResponse(status=204)
 
+@staff_member_required
+def export_votes(request, fmt, pk=None):
+    """Stream the raw votes of one question, or of the questions published between ``since`` and ``until``."""
+    if pk is not None:
+        get_object_or_404(Question, pk=pk)
+    try:
+        since = parse_range(request.GET.get('since'))
+        until = parse_range(request.GET.get('until'))
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(export_lines(vote_rows(pk, since, until), fmt), content_type=FORMATS[fmt])
+    filename = f'votes-{pk}.{fmt}' if pk is not None else f'votes.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@staff_member_required
+def cache_stats(request):
+    """Show the hit and miss counters of the results cache."""
+    return JsonResponse(results_cache.stats())
+
+@staff_member_required
+def rate_limit_stats(request):
+    """Show the counters of the per-IP and per-session rate limiters."""
+    return JsonResponse({'ip': ip_limiter.stats(), 'session': session_limiter.stats()})
+
+@staff_member_required
+def request_timings(request):
+    """Show the query counts and timings of the requests served, per URL name."""
+    return JsonResponse(request_stats.snapshot())
+
+def encode_cursor(question):
+    """Return the pagination cursor of `question`: its pub_date in microseconds and its id."""
+    return f'{(question.pub_date - EPOCH) // datetime.timedelta(microseconds=1)}_{question.id}'
+
+def decode_cursor(cursor):
+    """Return the (pub_date, id) pair of a cursor, or None if it is missing or malformed."""
+    try:
+        micros, pk = (int(part) for part in cursor.split('_'))
+        if not 0 < pk < 2 ** 63:
+            raise OverflowError(pk)
+        return EPOCH + datetime.timedelta(microseconds=micros), pk
+    except (AttributeError, ValueError, OverflowError):
+        return None
@@ -0,0 +1,116 @@
+"""Pay the first-request costs of a worker before it takes traffic."""
+import io
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DatabaseError, connections
+from django.template import TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def load_urlconf():
+    """Import every view module and build the reverse lookup tables."""
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+    return len(resolver.reverse_dict)
+
+
+def template_names(engine):
+    """Return the names of the HTML templates found in the directories of `engine`."""
+    names = set()
+    for directory in list(engine.dirs) + list(get_app_template_dirs('templates')):
+        for root, _, files in os.walk(directory):
+            names.update(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+                         for name in files if name.endswith('.html'))
+    return sorted(names)
+
+
+def compile_templates():
+    """Compile every project and app template; the cached loader keeps them for the life of the process."""
+    compiled = 0
+    for engine in engines.all():
+        for name in template_names(engine):
+            try:
+                engine.get_template(name)
+            except TemplateSyntaxError:
+                # some app templates only compile in their own context (e.g. missing tag libraries).
+                continue
+            compiled += 1
+    return compiled
+
+
+def prime_results_cache():
+    """Load the tallies of the newest open questions into the results cache."""
+    from .cache import results_cache
+    from .models import Question
+
+    questions = list(Question.objects.with_status('open').order_by('-pub_date', '-id')
+                     [:settings.POLLS_WARMUP_QUESTIONS])
+    for question in questions:
+        results_cache.results(question)
+    return len(questions)
+
+
+def request_urls(urls):
+    """GET each URL through the full middleware stack, filling the page and fragment caches."""
+    from .middleware import request_stats
+
+    handler = WSGIHandler()
+    statuses = []
+    for url in urls:
+        path, _, query = url.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+        }
+        response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        for _ in response:
+            pass
+        response.close()
+    # warm-up requests must not show up in the request timings.
+    request_stats.reset()
+    return statuses
+
+
+def open_connections():
+    """Connect to every configured database."""
+    opened = 0
+    for connection in connections.all():
+        try:
+            connection.ensure_connection()
+        except DatabaseError:
+            logger.warning('Warm-up could not connect to database %s', connection.alias)
+            continue
+        opened += 1
+    return opened
+
+
+def warm_up():
+    """Run every warm-up stage and return the milliseconds each one took."""
+    stages = [
+        ('urlconf', load_urlconf),
+        ('templates', compile_templates),
+        ('results_cache', prime_results_cache),
+        ('requests', lambda: request_urls(settings.POLLS_WARMUP_URLS)),
+        # last, because finishing a request closes connections that are not persistent.
+        ('connections', open_connections),
+    ]
+    timings = {}
+    for name, stage in stages:
+        start = time.perf_counter()
+        try:
+            result = stage()
+        except Exception:
+            logger.exception('Warm-up stage %s failed', name)
+            result = None
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info('Warm-up %s: %s in %.1f ms', name, result, timings[name])
+    return timings